@@ -0,0 +1,97 @@
+"""
+Compare the List view fetching entities against ``list_projection``.
+
+    python benchmarks/list_projection.py [rows] [per_page] [repeat]
+
+Prints the latency and peak memory of fetching a page with
+``get_items``, and of a whole List GET, for both modes.
+"""
+import sys
+import time
+import tracemalloc
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.ext.declarative import declarative_base
+from flask import Flask
+
+from flask_manager import tree as tree_, display_rules
+from flask_manager.ext import sqlalchemy
+
+
+Base = declarative_base()
+
+
+class Model(Base):
+    __tablename__ = 'model'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+    description = sa.Column(sa.Text(), nullable=False)
+    value = sa.Column(sa.Integer(), nullable=False)
+    price = sa.Column(sa.Float(), nullable=False)
+    enabled = sa.Column(sa.Boolean(), nullable=False)
+
+
+def create_session(rows):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    engine.execute(Model.__table__.insert(), [
+        {'name': 'name {}'.format(i), 'description': 'text ' * 50,
+         'value': i, 'price': i / 3, 'enabled': bool(i % 2)}
+        for i in range(rows)
+    ])
+    return orm.scoped_session(orm.sessionmaker(bind=engine))
+
+
+def create_controller(db_session, per_page, list_projection):
+    class Controller(sqlalchemy.SQLAlchemyController):
+        model_class = Model
+        extra_display_rules = {
+            'list': display_rules.ColumnSet(['name', 'value']),
+        }
+    Controller.list_projection = list_projection
+    return Controller(db_session=db_session, per_page=per_page)
+
+
+def measure(func, db_session, repeat):
+    func()  # warm up
+    timings = []
+    for _ in range(repeat):
+        db_session.remove()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    # tracemalloc slows everything down, measure memory apart
+    db_session.remove()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main(rows=10000, per_page=1000, repeat=10):
+    db_session = create_session(rows)
+    for list_projection in (False, True):
+        controller = create_controller(db_session, per_page, list_projection)
+        app = Flask(__name__)
+        app.register_blueprint(tree_.Index(
+            name='Benchmark', url='', items=[controller]).create_blueprint())
+        client = app.test_client()
+
+        def fetch():
+            items, _ = controller.get_items()
+            return list(items)
+
+        def request():
+            assert client.get('/model/').status_code == 200
+
+        for name, func in (('fetch', fetch), ('request', request)):
+            latency, peak = measure(func, db_session, repeat)
+            print('{:8} list_projection={!s:5} latency={:7.1f}ms '
+                  'peak={:7.1f}KiB'.format(
+                      name, list_projection, latency * 1000, peak / 1024))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
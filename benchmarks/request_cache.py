@@ -0,0 +1,65 @@
+"""
+Per request overhead of ``get_roles`` and ``endpoints_tree``,
+with and without the request cache.
+
+    python benchmarks/request_cache.py [controllers] [repeat]
+
+A List request calls ``get_roles`` 3 times ( ``is_allowed``,
+``context`` and ``List.get`` ) and ``endpoints_tree`` once,
+uncached means rebuilding both, including the menu, every time.
+"""
+import sys
+import time
+
+from flask import Flask
+
+from flask_manager import tree as tree_, controller as controller_
+
+
+def create_tree(size):
+    groups = [
+        tree_.Tree('Group {}'.format(group), items=[
+            controller_.Controller(name='Controller {} {}'.format(group, i))
+            for i in range(10)
+        ])
+        for group in range(size // 10)
+    ]
+    return tree_.Index('Benchmark', url='', items=groups)
+
+
+def uncached(controller):
+    get_roles = controller_.Controller.get_roles.__wrapped__
+    for _ in range(3):
+        get_roles(controller)
+    tree_.Tree.endpoints(controller.parent.parent)
+
+
+def cached(controller):
+    for _ in range(3):
+        controller.get_roles()
+    controller.endpoints_tree()
+
+
+def measure(app, func, controller, repeat):
+    timings = []
+    for _ in range(repeat):
+        with app.test_request_context('/'):
+            start = time.perf_counter()
+            func(controller)
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(size=200, repeat=200):
+    tree = create_tree(size)
+    app = Flask(__name__)
+    app.register_blueprint(tree.create_blueprint())
+    controller = tree.items[-1].items[-1]
+    for name, func in (('uncached', uncached), ('cached', cached)):
+        latency = measure(app, func, controller, repeat)
+        print('{:8} controllers={} per request={:.1f}us'.format(
+            name, size, latency * 1000000))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
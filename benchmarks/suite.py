@@ -0,0 +1,398 @@
+"""
+Offline benchmark suite, against SQLite and the in-memory example
+controller ( ``examples/complete.py`` ).
+
+    python benchmarks/suite.py [--rows 10000,100000] [--repeat 5]
+                               [--only tree,list,filter,crud,startup]
+                               [--output results.jsonl]
+    python benchmarks/suite.py --compare before.jsonl after.jsonl
+
+Writes a json line describing the run ( commit, python and libraries
+versions ), then a json line per measure::
+
+    {"benchmark": "list", "params": {"backend": "sqlite", ...},
+     "min_ms": 1.2, "median_ms": 1.3, "repeat": 5}
+
+``--compare`` matches the measures of two runs, prints the ratio of
+their medians, and exits with 1 if any is slower than ``--threshold``.
+
+Benchmarks:
+    tree: ``Index.create_blueprint`` for 10/100/1000 controllers.
+    list: ``List`` GET at ``per_page`` 100/1000, ``ColumnSet`` rendering.
+    filter: ``SearchFilter`` and ``FieldFilter`` queries, per ``--rows``.
+    crud: ``Update`` and ``Delete`` POST round trips.
+    startup: ``create_blueprint`` and its registration, for 100/1000
+        generated controllers, eager and lazy, a process per run,
+        with the RSS it added and the time of the first request.
+"""
+from collections import defaultdict
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import flask
+import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.ext.declarative import declarative_base
+from flask import Flask
+
+from flask_manager import tree as tree_, display_rules
+from flask_manager.ext import memory, sqlalchemy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'examples'))
+import complete  # noqa: E402 pylint: disable=wrong-import-position
+
+
+Base = declarative_base()
+
+
+class Model(Base):
+    __tablename__ = 'model'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+    category = sa.Column(sa.Integer(), nullable=False, index=True)
+    value = sa.Column(sa.Integer(), nullable=False)
+    enabled = sa.Column(sa.Boolean(), nullable=False)
+
+
+# {{{ Datasets
+def create_session(rows):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    chunk = 10000
+    for start in range(0, rows, chunk):
+        engine.execute(Model.__table__.insert(), [
+            {'name': 'name {}'.format(i), 'category': i % 100,
+             'value': i, 'enabled': bool(i % 2)}
+            for i in range(start, min(start + chunk, rows))
+        ])
+    return orm.scoped_session(orm.sessionmaker(bind=engine))
+
+
+def create_storage(rows):
+    # inserted before the controller adds its indexes, sorted once,
+    # ``string`` is a FieldFilter, its distinct values are the choices
+    storage = memory.MemoryStorage()
+    for i in range(rows):
+        storage.insert(memory.Record(
+            integer=i % 100, string='name {}'.format(i % 1000),
+            boolean=bool(i % 2)))
+    return storage
+
+
+def create_sqlite_controller(rows, per_page=100):
+    class Controller(sqlalchemy.SQLAlchemyController):
+        model_class = Model
+        filters = {
+            'search': sqlalchemy.SearchFilter([Model.name]),
+            'category': sqlalchemy.FieldFilter(Model.category),
+        }
+        extra_display_rules = {
+            'list': display_rules.ColumnSet(['name', 'value', 'enabled']),
+        }
+    return Controller(
+        name='Model', db_session=create_session(rows), per_page=per_page)
+
+
+def create_memory_controller(rows, per_page=100):
+    return complete.Controller(
+        name='Model', storage=create_storage(rows), per_page=per_page)
+
+
+BACKENDS = {
+    'sqlite': (create_sqlite_controller, {
+        'search': {'search': 'name 12'}, 'field': {'category': '7'}}),
+    'memory': (create_memory_controller, {
+        'search': {'search': 'name 12'}, 'field': {'integer': '7'}}),
+}
+
+
+def create_client(controller):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.register_blueprint(tree_.Index(
+        name='Benchmark', url='', items=[controller]).create_blueprint())
+    return app.test_client()
+
+
+def reset(controller):
+    # a empty identity map, as in a new request
+    db_session = getattr(controller, 'db_session', None)
+    if db_session is not None:
+        db_session.remove()
+
+
+def max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return rss / 1024 ** (2 if sys.platform == 'darwin' else 1)
+
+
+def startup(controllers, lazy):
+    """Print the json of the startup of a tree of ``controllers``
+    generated models, ran by ``--startup`` in a process of its own.
+    """
+    base = declarative_base()
+    models = [
+        type('Model{}'.format(i), (base, ), {
+            '__tablename__': 'model_{}'.format(i),
+            'id': sa.Column(sa.Integer(), primary_key=True),
+            'name': sa.Column(sa.String(255), nullable=False),
+            'value': sa.Column(sa.Integer(), nullable=False),
+            'enabled': sa.Column(sa.Boolean(), nullable=False),
+        })
+        for i in range(controllers)
+    ]
+    engine = sa.create_engine('sqlite://')
+    db_session = orm.scoped_session(orm.sessionmaker(bind=engine))
+    rss = max_rss_mb()
+    start = time.perf_counter()
+    index = tree_.Index(name='Benchmark', url='', items=[
+        tree_.Tree('Group {}'.format(group), items=[
+            sqlalchemy.SQLAlchemyController(
+                db_session=db_session, model_class=model)
+            for model in models[group:group + 100]
+        ])
+        for group in range(0, controllers, 100)
+    ])
+    index.lazy = lazy
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.register_blueprint(index.create_blueprint())
+    seconds = time.perf_counter() - start
+    base.metadata.create_all(engine, tables=[models[0].__table__])
+    client = app.test_client()
+    start = time.perf_counter()
+    assert client.get('/group_0/model0/').status_code == 200
+    print(json.dumps({
+        'seconds': seconds,
+        'first_request_ms': (time.perf_counter() - start) * 1000,
+        'rss_mb': max_rss_mb() - rss,
+    }))
+# }}}
+
+
+# {{{ Benchmarks
+def bench_tree(args):
+    for size in (10, 100, 1000):
+        def setup(size=size):
+            groups = [
+                tree_.Tree('Group {}'.format(group), items=[
+                    complete.Controller(
+                        name='Controller {} {}'.format(group, i),
+                        storage=memory.MemoryStorage())
+                    for i in range(10)
+                ])
+                for group in range(size // 10)
+            ]
+            return (tree_.Index('Benchmark', url='', items=groups), )
+
+        def create_blueprint(tree):
+            tree.create_blueprint()
+        yield {'controllers': size}, create_blueprint, setup
+
+
+def bench_list(args):
+    rows = args.rows[0]
+    for backend, (create, _) in BACKENDS.items():
+        for per_page in (100, 1000):
+            controller = create(rows, per_page)
+            client = create_client(controller)
+
+            def request(client=client):
+                assert client.get('/model/').status_code == 200
+            yield ({'backend': backend, 'rows': rows, 'per_page': per_page},
+                   request, lambda controller=controller: reset(controller))
+
+
+def bench_filter(args):
+    for rows in args.rows:
+        for backend, (create, filters) in BACKENDS.items():
+            controller = create(rows)
+            for name, params in filters.items():
+                def query(controller=controller, params=params):
+                    items, total = controller.get_items(filters=params)
+                    return list(items), total
+                yield ({'backend': backend, 'rows': rows, 'filter': name},
+                       query, lambda controller=controller: reset(controller))
+
+
+def bench_crud(args):
+    rows = args.rows[0]
+    for backend, (create, _) in BACKENDS.items():
+        controller = create(rows)
+        client = create_client(controller)
+        # a pk per run, warm up included, updated then deleted
+        pks = iter(range(1, rows + 1))
+
+        def update(client=client, pks=pks):
+            response = client.post(
+                '/model/update/{}/'.format(next(pks)),
+                data={'name': 'changed', 'category': '1', 'value': '1',
+                      'enabled': 'y', 'integer': '1', 'string': 'changed'})
+            assert response.status_code == 302
+
+        yield ({'backend': backend, 'rows': rows, 'operation': 'update'},
+               update, lambda controller=controller: reset(controller))
+
+        def delete(client=client, pks=pks):
+            response = client.post('/model/delete/{}/'.format(next(pks)))
+            assert response.status_code == 302
+
+        yield ({'backend': backend, 'rows': rows, 'operation': 'delete'},
+               delete, lambda controller=controller: reset(controller))
+
+
+def bench_startup(args):
+    for controllers in (100, 1000):
+        for mode in ('eager', 'lazy'):
+            def run_startup(controllers=controllers, mode=mode):
+                output = subprocess.check_output([
+                    sys.executable, os.path.abspath(__file__),
+                    '--startup', '{},{}'.format(controllers, mode)])
+                return json.loads(output.decode().splitlines()[-1])
+            yield {'controllers': controllers, 'mode': mode}, run_startup, None
+
+
+BENCHMARKS = {
+    'tree': bench_tree,
+    'list': bench_list,
+    'filter': bench_filter,
+    'crud': bench_crud,
+    'startup': bench_startup,
+}
+# }}}
+
+
+# {{{ Runner
+def measure(func, setup, repeat):
+    """Return the timings of ``repeat`` calls of ``func(*setup())``,
+    after a warm up, ``setup`` is not timed, and the medians of the
+    other measures ``func`` returns, if it returns a dict, whose
+    ``seconds`` replaces the timing of the call.
+    """
+    setup = setup or (lambda: ())
+    func(*(setup() or ()))
+    timings, measures = [], defaultdict(list)
+    for _ in range(repeat):
+        args = setup() or ()
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        if isinstance(result, dict):
+            elapsed = result.pop('seconds', elapsed)
+            for key, value in result.items():
+                measures[key].append(value)
+        timings.append(elapsed)
+    return timings, {
+        key: round(statistics.median(values), 3)
+        for key, values in measures.items()
+    }
+
+
+def describe_run():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'run': datetime.datetime.utcnow().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'flask': flask.__version__,
+        'sqlalchemy': sa.__version__,
+    }
+
+
+def run(args, output):
+    output.write(json.dumps(describe_run()) + '\n')
+    for name in args.only:
+        for params, func, setup in BENCHMARKS[name](args):
+            timings, measures = measure(func, setup, args.repeat)
+            result = {
+                'benchmark': name,
+                'params': params,
+                'min_ms': round(min(timings) * 1000, 3),
+                'median_ms': round(statistics.median(timings) * 1000, 3),
+                'repeat': args.repeat,
+                **measures,
+            }
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+
+
+def load_results(path):
+    with open(path) as results:
+        lines = [json.loads(line) for line in results if line.strip()]
+    return {
+        (line['benchmark'], json.dumps(line['params'], sort_keys=True)):
+            line['median_ms']
+        for line in lines if 'benchmark' in line
+    }
+
+
+def compare(before_path, after_path, threshold):
+    """Print the ratio of the medians, return True if none regressed."""
+    before, after = load_results(before_path), load_results(after_path)
+    ok = True
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key] / before[key] if before[key] else 1.0
+        slower = ratio > threshold
+        ok = ok and not slower
+        print('{:7} {:60} {:9.2f}ms {:9.2f}ms {:5.2f}x{}'.format(
+            key[0], key[1], before[key], after[key], ratio,
+            '  SLOWER' if slower else ''))
+    return ok
+# }}}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        '--rows', default='10000,100000',
+        type=lambda value: [int(rows) for rows in value.split(',')],
+        help='dataset sizes, comma separated, the first is used by '
+             'list and crud')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--only', default=','.join(BENCHMARKS),
+        type=lambda value: value.split(','),
+        help='benchmarks to run, comma separated')
+    parser.add_argument('--output', help='json lines file, default stdout')
+    parser.add_argument(
+        '--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+        help='compare two runs instead of running')
+    parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help='slowest ratio accepted by --compare')
+    parser.add_argument('--startup', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.startup:
+        controllers, mode = args.startup.split(',')
+        startup(int(controllers), mode == 'lazy')
+        return
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.threshold) else 1)
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(unknown)))
+    if args.output is None:
+        run(args, sys.stdout)
+    else:
+        with open(args.output, 'w') as output:
+            run(args, output)
+
+
+if __name__ == '__main__':
+    main()
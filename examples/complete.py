@@ -1,33 +1,17 @@
 from wtforms import form as form_, fields as fields_, validators
 from flask import Flask
 from flask_manager import (
-    controller as controller_,
     tree as tree_,
     components as components_,
     display_rules as display_rules_
 )
+from flask_manager.ext import memory
 
 
 FIELD_NAMES = ('integer', 'string', 'boolean')
 
 
-class MagicDict(dict):
-    __setattr__ = dict.__setitem__
-    __getattr__ = dict.__getitem__
-    __delattr__ = dict.__delitem__
-
-
-class DataStorage:
-    next_pk = 0
-    items = {}
-
-    def insert(self, item):
-        self.items[self.next_pk] = item
-        item['id'] = self.next_pk
-        self.next_pk += 1
-
-
-data_storage = DataStorage()
+data_storage = memory.MemoryStorage()
 
 
 class Form(form_.Form):
@@ -51,40 +35,8 @@ class UpdateCustonForm(components_.Update):
         return Form2(*args, **kwargs)
 
 
-class SearchFilter(controller_.SearchFilter):
-    def __init__(self, fields):
-        self.fields = fields
-
-    def filter(self, items, value):
-        return [
-            item
-            for item in items
-            for field_value in [
-                item[field] for field in self.fields]
-            if value in field_value
-        ]
-
-
-class FieldFilter(controller_.FieldFilter):
-    def __init__(self, field, coerce=str):
-        self.field = field
-        self.coerce = coerce
-
-    def filter(self, items, value):
-        return [
-            item
-            for item in items
-            if item[self.field] == self.coerce(value)
-        ]
-
-    def get_choices(self):
-        return [
-            (item.get(self.field), str(item.get(self.field)).title())
-            for item in data_storage.items.values()
-        ]
-
-
-class Controller(controller_.Controller):
+class Controller(memory.MemoryController):
+    storage = data_storage
     components = (
         components_.List,
         components_.Create,
@@ -96,10 +48,11 @@ class Controller(controller_.Controller):
         'print': print,
     }
     filters = {
-        'search': SearchFilter(['string']),
-        'string': FieldFilter('string'),
-        'integer': FieldFilter('integer', coerce=int),
+        'search': memory.SearchFilter(['string']),
+        'string': memory.FieldFilter('string'),
+        'integer': memory.FieldFilter('integer', coerce=int),
     }
+    orderable = FIELD_NAMES
     display_rules = {
         'list': display_rules_.ColumnSet(FIELD_NAMES),
         'create': display_rules_.FormFieldSet(FIELD_NAMES),
@@ -108,34 +61,13 @@ class Controller(controller_.Controller):
         'delete': display_rules_.DataFieldSetWithConfirm(FIELD_NAMES),
     }
 
-    def get_items(self, page=1, order_by=None, filters=None):
-        items = data_storage.items.values()
-        for filter_, value in self.get_filters(filters):
-            items = filter_.filter(items, value)
-        return items, len(data_storage.items)
-
-    def get_item(self, pk):
-        return data_storage.items[int(pk)]
-
-    def create_item(self, form):
-        item = MagicDict()
-        data_storage.insert(item)
-        return self.update_item(item, form)
-
-    def update_item(self, item, form):
-        form.populate_obj(item)
-        return item
-
-    def delete_item(self, item):
-        del data_storage.items[int(item.id)]
-
 
 def main():
     for i in range(10):
-        data_storage.insert(MagicDict(
+        data_storage.insert(memory.Record(
             integer=i, string=str(i), boolean=bool(i % 2)))
     for i in range(20, 30):
-        data_storage.insert(MagicDict(
+        data_storage.insert(memory.Record(
             integer=i, string='other {}'.format(i), boolean=bool(i % 2)))
 
     tree = tree_.Index('Example', url='', items=[
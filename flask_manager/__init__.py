@@ -1,6 +1,10 @@
-from .components import List, Create, Read, Update, Delete
+from .components import (
+    List, Create, Read, Update, Delete, Export, Import,
+    AsyncList, AsyncCreate, AsyncRead, AsyncUpdate, AsyncDelete, AsyncImport)
 from .tree import Tree, Index
-from .controller import Controller, Filter, SearchFilter, FieldFilter
+from .controller import (
+    Controller, AsyncController, Filter, SearchFilter, FieldFilter,
+    KeysetPage, EstimatedTotal)
 
 
 __version__ = '0.0.1'
@@ -2,17 +2,37 @@ from functools import partial
 from math import ceil
 from enum import Enum
 import traceback
+import hashlib
+import codecs
+import json
+import csv
+import io
+import os
 
-from flask import request, abort, url_for, flash, current_app
-from werkzeug.datastructures import CombinedMultiDict
+from flask import (
+    request, abort, url_for, flash, current_app, session, make_response,
+    get_flashed_messages, Response, stream_with_context, jsonify)
+from werkzeug.datastructures import CombinedMultiDict, MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
 
-from flask_manager import views
+import wtforms
+
+from flask_manager import views, utils, display_rules, timing
 
 
 # pylint: disable=abstract-method
 class Component(views.View):
     role = None
     url = None
+    # answer GETs with 304 when ``get_validator`` did not change
+    conditional = False
+    # the display rules whose fields are dumped in json, default role
+    json_role = None
+    # status of json responses to a successful post
+    success_status = 200
+    # check the queries against the controller budget
+    query_budget = False
 
     def __init__(self, controller, *args, **kwargs):
         """
@@ -22,6 +42,10 @@ class Component(views.View):
         self.controller = controller
         super().__init__(*args, **kwargs)
 
+    @property
+    def server_timing(self):
+        return self.controller.server_timing
+
     def get_success_url(self, params=None, item=None):
         if params is None:
             return url_for(self.success_url)
@@ -40,17 +64,184 @@ class Component(views.View):
         roles = self.controller.get_roles()
         allowed = roles.get(self.role.name, ())
         return self.view_name in allowed
+
+    @utils.request_cached
+    def get_roles_key(self):
+        """The user roles as a hashable, they change the buttons."""
+        return tuple(sorted(
+            (key, tuple(sorted(value)))
+            for key, value in self.controller.get_roles().items() if value))
+    # }}}
+
+    # {{{ Conditional GET
+    def get_validator(self, *args, **kwargs):
+        """Return ``(etag, last_modified)`` of the page, from the
+        controller, either may be None.
+        """
+        return None, None
+
+    def is_conditional(self):
+        # a pending flash message would be lost in a 304
+        return (
+            self.conditional and
+            request.method in ('GET', 'HEAD') and
+            '_flashes' not in session
+        )
+
+    def make_etag(self, etag, last_modified):
+        """Mix the user roles, which change the page, in the etag."""
+        if etag is None and last_modified is None:
+            return None
+        if etag is None:
+            etag = last_modified.isoformat()
+        key = (etag, self.get_roles_key(), self.wants_json())
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def not_modified(self, etag, last_modified):
+        """Return a 304 response if the client has the page, or None."""
+        if etag is None or is_resource_modified(
+                request.environ, etag=etag, last_modified=last_modified):
+            return None
+        return self.set_validator(
+            current_app.response_class(status=304), etag, last_modified)
+
+    def set_validator(self, response, etag, last_modified):
+        if etag is None:
+            return response
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.vary.add('Accept')
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    # }}}
+
+    # {{{ Fragment cache
+    def fragment(self, item, caller):
+        """Render the ``{% call fragment(item) %}`` block, cached in
+        ``display_rules.fragment_cache`` when the controller has
+        ``cache_fragments`` and a version for ``item``.
+        """
+        version = None
+        if self.controller.cache_fragments:
+            version = self.controller.get_item_version(item)
+        if version is None:
+            return caller()
+        env = current_app.jinja_env
+        key = (
+            self.view_name, version, self.get_roles_key(),
+            request.script_root, env, display_rules.template_cache.generation,
+        )
+        cache = display_rules.fragment_cache
+        pk = display_rules.get_field_value(item, 'id')
+        html = cache.get(self.controller, pk, key)
+        if html is None:
+            html = caller()
+            cache.set(self.controller, pk, key, html)
+        return html
+    # }}}
+
+    # {{{ JSON
+    @utils.request_cached
+    def wants_json(self):
+        """True if the client sent json, or prefers it to html."""
+        if request.is_json:
+            return True
+        best = request.accept_mimetypes.best_match(
+            ('text/html', 'application/json'))
+        return best == 'application/json'
+
+    def get_json_fields(self):
+        """The ``id`` and the fields read by the display rules."""
+        role = self.json_role or self.role
+        rules = self.controller.display_rules.get(role.name)
+        names = display_rules.iter_field_names(rules) if rules else ()
+        return list(dict.fromkeys(('id', *names)))
+
+    def dump_item(self, item, fields=None):
+        if fields is None:
+            fields = self.get_json_fields()
+        return {
+            field: display_rules.get_field_value(item, field)
+            for field in fields
+        }
+
+    def json_context(self, context):
+        """Return ``(data, status)`` of the json response of ``context``,
+        failed posts are answered with 400, the form errors and the
+        flashed messages.
+        """
+        data = {}
+        form = context.get('form')
+        if form is not None:
+            if form.errors:
+                data['errors'] = form.errors
+            elif request.method not in ('POST', 'PUT'):
+                data['form'] = form.data
+        item = context.get('item')
+        if item is not None:
+            data['item'] = self.dump_item(item)
+        messages = get_flashed_messages()
+        if messages:
+            data['messages'] = messages
+        status = 200
+        if request.method in ('POST', 'PUT'):
+            status = 400
+        return data, status
+
+    def render_json(self, data, status=200):
+        if status == 204:
+            return current_app.response_class(status=status)
+        return current_app.response_class(
+            utils.dump_json(data), status=status, mimetype='application/json')
+
+    def json_error(self, error):
+        """Answer a ``HTTPException`` as json, re-raise it for html."""
+        if not self.wants_json() or error.code is None:
+            raise error
+        data = {'error': error.name, 'description': error.description}
+        return self.render_json(data, error.code)
+
+    def success_response(self, return_url, context):
+        if not self.wants_json():
+            return super().success_response(return_url, context)
+        data, _ = self.json_context(context)
+        return self.render_json(data, self.success_status)
     # }}}
 
     # {{{ View
     def dispatch_request(self, *args, **kwargs):
-        if not self.is_allowed():
-            abort(401)
-        return super().dispatch_request(*args, **kwargs)
+        if self.server_timing:
+            timing.start(self)
+        with self.controller.track_queries(self.query_budget):
+            try:
+                if not self.is_allowed():
+                    abort(401)
+                if not self.is_conditional():
+                    return super().dispatch_request(*args, **kwargs)
+                with timing.phase('validator'):
+                    etag, last_modified = self.get_validator(*args, **kwargs)
+                etag = self.make_etag(etag, last_modified)
+                response = self.not_modified(etag, last_modified)
+                if response is None:
+                    response = make_response(
+                        super().dispatch_request(*args, **kwargs))
+                    self.set_validator(response, etag, last_modified)
+                return response
+            except HTTPException as e:
+                return self.json_error(e)
 
     def context(self, external_ctx=None):
+        if self.wants_json():
+            # rendered by json_context, without the templates context
+            return external_ctx or {}
+        rules = self.controller.display_rules.get(self.role.name)
+        if rules is not None and timing.get_timings() is not None:
+            rules = timing.Timed('rules', rules)
         ctx = {
-            'display_rules': self.controller.display_rules.get(self.role.name),
+            'display_rules': rules,
+            'fragment': self.fragment,
             'tree': self.controller.endpoints_tree(),
             'roles': self.controller.get_roles(),
             'success_url': self.success_url,
@@ -58,10 +249,20 @@ class Component(views.View):
         if external_ctx is not None:
             ctx.update(external_ctx)
         return super().context(ctx)
+
+    def render_response(self, context):
+        if self.wants_json():
+            return self.render_json(*self.json_context(context))
+        return super().render_response(context)
     # }}}
 
     # {{{ Convenience
     def get_form_data(self):
+        if request.is_json:
+            try:
+                return utils.json_to_formdata(request.get_json())
+            except ValueError:
+                abort(400)
         return CombinedMultiDict([request.form, request.files])
 
     def get_form(self, *args, **kwargs):
@@ -81,21 +282,61 @@ class Roles(Enum):
     read = 3
     update = 4
     delete = 5
+    export = 6
+    upload = 7  # Import, ``import`` is a keyword
 
 
 class List(Component):
     role = Roles.list
     url = ''
     template_name = ('crud/list.html', )
+    conditional = True
+    query_budget = True
+
+    def get_validator(self):
+        return self.controller.get_list_validator(filters=request.args)
 
     def get(self):
+        with timing.phase('items'):
+            items, total = self.get_items()
+            if timing.get_timings() is not None and \
+                    not isinstance(items, list):
+                # fetch the rows here, not while rendering
+                items = list(items)
+        if self.wants_json():
+            return {'items': items, 'total': total}
+        return self.list_context(items, total)
+
+    def get_items(self):
+        """Fetch the page of items and the total from the controller."""
+        order_by = request.args.get('order_by')
+        if self.controller.keyset_pagination:
+            try:
+                return self.controller.get_items(
+                    order_by=order_by, filters=request.args,
+                    cursor=request.args.get('cursor'))
+            except ValueError:
+                abort(400)
+        page = int(request.args.get('page', 1))
+        return self.controller.get_items(
+            page=page, order_by=order_by, filters=request.args)
+
+    def list_context(self, items, total):
         order_by = request.args.get('order_by')
         page = int(request.args.get('page', 1))
 
-        filter_form = self.controller.get_filter_form()
+        keyset = self.controller.keyset_pagination
+        cursor = request.args.get('cursor')
+
+        with timing.phase('filters'):
+            filter_form = self.controller.get_filter_form()(request.args)
         action_form = self.controller.get_action_form()
+        url_args = request.args.to_dict()
+        if keyset:
+            # a cursor is only valid for the current order and filters
+            url_args.pop('cursor', None)
         url_generator = partial(
-            url_for, request.url_rule.endpoint, **request.args)
+            url_for, request.url_rule.endpoint, **url_args)
         roles = self.controller.get_roles()
         has_roles = bool(
             roles.get('read') or
@@ -103,16 +344,30 @@ class List(Component):
             roles.get('delete')
         )
 
-        items, total = self.controller.get_items(
-            page=page, order_by=order_by, filters=request.args)
-        if self.controller.per_page == 0:
-            pages = 0
+        if total is None:
+            items = list(items)
+        pages = self.get_pages(items, total, page)
+        estimated = getattr(total, 'estimated', False)
+        if total is None:
+            total_label = 'Unknown'
+        elif estimated:
+            total_label = '~{}'.format(utils.humanize_number(total))
         else:
-            pages = ceil(total/self.controller.per_page)
+            total_label = str(total)
+        export_args = {
+            key: value for key, value in url_args.items()
+            if key not in ('page', 'cursor')
+        }
+        remote = {
+            key: url_for(self.controller.choices_endpoint, name=key)
+            for key in self.controller.get_remote_filters()
+        }
         return {
+            'export_args': export_args,
             'forms': {
                 'filter': {'show': bool(self.controller.filters),
-                           'form': filter_form(request.args)},
+                           'form': filter_form,
+                           'remote': remote},
                 'action': {'show': bool(self.controller.actions),
                            'form': action_form()},
             },
@@ -121,14 +376,51 @@ class List(Component):
                 'order_by': order_by,
                 'page': page,
                 'total': total,
+                'total_label': total_label,
+                'estimated': estimated,
                 'pages': pages,
                 'url_generator': url_generator,
+                'keyset': keyset,
+                'cursor': cursor,
+                'next_cursor': getattr(items, 'next_cursor', None),
+                'prev_cursor': getattr(items, 'prev_cursor', None),
             },
             'items': items,
         }
 
+    def get_pages(self, items, total, page):
+        per_page = self.controller.per_page
+        if self.controller.keyset_pagination or per_page == 0:
+            return 0
+        if total is None:
+            # the count was dropped, one more page if this one is full
+            return page + 1 if len(items) >= per_page else page
+        return ceil(total/per_page)
+
+    def json_context(self, context):
+        if 'items' not in context:
+            return super().json_context(context)
+        items, total = list(context['items']), context['total']
+        page = int(request.args.get('page', 1))
+        fields = self.get_json_fields()
+        data = {
+            'items': [self.dump_item(item, fields) for item in items],
+            'pagination': {
+                'page': page,
+                'per_page': self.controller.per_page,
+                'pages': self.get_pages(items, total, page),
+                'total': total,
+                'estimated': getattr(total, 'estimated', False),
+                'next_cursor': getattr(context['items'], 'next_cursor', None),
+                'prev_cursor': getattr(context['items'], 'prev_cursor', None),
+            },
+        }
+        return data, 200
+
     def post(self):
-        self.controller.execute_action(self.get_form_data())
+        done = self.controller.execute_action(self.get_form_data())
+        if done is False and self.wants_json():
+            abort(400)
         return self.get_success_url(), {}
 
 
@@ -136,6 +428,8 @@ class Create(Component):
     role = Roles.create
     url = 'create/'
     template_name = ('crud/form.html', 'crud/create.html')
+    json_role = Roles.read
+    success_status = 201
 
     def get(self):
         form_data = self.get_form_data()
@@ -145,7 +439,7 @@ class Create(Component):
     def post(self):
         form_data = self.get_form_data()
         form = self.get_form(form_data)
-        success_url = None
+        success_url, item = None, None
         if form.validate():
             try:
                 item = self.controller.create_item(form)
@@ -154,13 +448,17 @@ class Create(Component):
                 flash(str(e))
             else:
                 success_url = self.get_success_url(form_data, item)
-        return success_url, {'form': form}
+        return success_url, {'form': form, 'item': item}
 
 
 class Read(Component):
     role = Roles.read
     url = 'read/<pk>/'
     template_name = ('crud/read.html', )
+    conditional = True
+
+    def get_validator(self, pk):
+        return self.controller.get_item_validator(self.get_item(pk))
 
     def get(self, pk):
         item = self.get_item(pk)
@@ -171,6 +469,11 @@ class Update(Component):
     role = Roles.update
     url = 'update/<pk>/'
     template_name = ('crud/form.html', 'crud/update.html')
+    conditional = True
+    json_role = Roles.read
+
+    def get_validator(self, pk):
+        return self.controller.get_item_validator(self.get_item(pk))
 
     def get(self, pk):
         item = self.get_item(pk)
@@ -197,6 +500,7 @@ class Delete(Component):
     role = Roles.delete
     url = 'delete/<pk>/'
     template_name = ('crud/delete.html', 'crud/read.html')
+    success_status = 204
 
     def get(self, pk):
         item = self.get_item(pk)
@@ -213,3 +517,540 @@ class Delete(Component):
         else:
             success_url = url_for(self.success_url)
         return success_url, {'pk': pk, 'item': item}
+
+
+class Export(Component):
+    """Download the items of the List, with its filters and order, not
+    in the default components, add it to ``Controller.components``
+    where a full download is wanted.
+    """
+    role = Roles.export
+    url = 'export/'
+    mimetypes = {
+        'csv': 'text/csv',
+        'jsonl': 'application/x-ndjson',
+    }
+    buffer_size = 64 * 1024
+
+    def get(self):
+        export_format = request.args.get('format', 'csv')
+        if export_format not in self.mimetypes:
+            abort(400)
+        items = self.controller.iter_items(
+            order_by=request.args.get('order_by'), filters=request.args)
+        columns = self.get_columns()
+        return {'format': export_format, 'columns': columns, 'items': items}
+
+    def get_columns(self):
+        """The names of the fields of the list display rule."""
+        rule = self.controller.display_rules.get(Roles.list.name)
+        return list(dict.fromkeys(display_rules.iter_field_names(rule)))
+
+    def render_response(self, context):
+        export_format = context['format']
+        writer = getattr(self, 'write_{}'.format(export_format))
+        chunks = self._buffered(writer(context['columns'], context['items']))
+        filename = '{}.{}'.format(self.controller.absolute_name, export_format)
+        return Response(
+            stream_with_context(chunks),
+            mimetype=self.mimetypes[export_format],
+            headers={
+                'Content-Disposition':
+                    'attachment; filename="{}"'.format(filename),
+            },
+        )
+
+    # {{{ Writers
+    def write_csv(self, columns, items):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for item in items:
+            writer.writerow([
+                display_rules.get_field_value(item, column)
+                for column in columns
+            ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def write_jsonl(self, columns, items):
+        for item in items:
+            yield json.dumps({
+                column: display_rules.get_field_value(item, column)
+                for column in columns
+            }, default=str) + '\n'
+
+    def _buffered(self, chunks):
+        # join the tiny per row chunks, one write per row is slow
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= self.buffer_size:
+                yield ''.join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield ''.join(buffer)
+    # }}}
+
+
+class ImportForm(wtforms.Form):
+    file = wtforms.FileField(
+        'File', validators=[wtforms.validators.InputRequired()])
+    format = wtforms.SelectField('Format', default='', choices=[
+        ('', 'From the file extension'),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ])
+
+
+class Import(Component):
+    """Create items from a uploaded csv or jsonl file, a item per row,
+    validated by the controller ``form_class``.
+
+    Valid rows are created by ``controller.create_many`` in batches of
+    ``controller.import_batch_size``, a failed batch is retried row by
+    row. The rows that failed are answered as a report, in the format
+    of the upload, with their line and errors.
+    """
+    role = Roles.upload
+    url = 'import/'
+    template_name = ('crud/import.html', )
+    form_class = ImportForm
+    mimetypes = Export.mimetypes
+    extensions = {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}
+
+    def get(self):
+        return {'form': self.form_class()}
+
+    def post(self):
+        form = self.form_class(self.get_form_data())
+        rows = self.read_upload(form)
+        if rows is None:
+            return None, {'form': form}
+        imported, failed = self.import_rows(rows)
+        return self.import_done(form, imported, failed)
+
+    def read_upload(self, form):
+        """Return a iterator of ``(line, row, formdata)`` of the upload,
+        None if ``form`` is not valid.
+        """
+        if not form.validate():
+            return None
+        upload = form.file.data
+        if not form.format.data:
+            _, extension = os.path.splitext(upload.filename or '')
+            extension = extension.lstrip('.').lower()
+            form.format.data = self.extensions.get(extension)
+        if form.format.data not in self.mimetypes:
+            form.format.errors.append('Unknown file format.')
+            return None
+        if not self._is_utf8(upload.stream):
+            form.file.errors.append('The file is not UTF-8 text.')
+            return None
+        reader = getattr(self, 'read_{}'.format(form.format.data))
+        return reader(codecs.iterdecode(upload.stream, 'utf-8-sig'))
+
+    @staticmethod
+    def _is_utf8(stream, chunk_size=64 * 1024):
+        # checked ahead, not a row is created from a file which fails
+        # to decode halfway
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            for chunk in iter(partial(stream.read, chunk_size), b''):
+                decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return False
+        finally:
+            stream.seek(0)
+        return True
+
+    def import_rows(self, rows):
+        """Validate and create ``rows``, return the number of items
+        created and a list of ``(line, row, errors)`` of the failed.
+        """
+        imported, failed, batch = 0, [], []
+        batch_size = self.controller.import_batch_size
+        for line, row, formdata in rows:
+            if formdata is None:
+                failed.append((line, row, {'': ['Invalid row.']}))
+                continue
+            form = self.get_form(formdata)
+            if not form.validate():
+                failed.append((line, row, form.errors))
+                continue
+            batch.append((line, row, form))
+            if len(batch) >= batch_size:
+                imported += self.create_batch(batch, failed)
+                batch = []
+        if batch:
+            imported += self.create_batch(batch, failed)
+        return imported, failed
+
+    def create_batch(self, batch, failed):
+        try:
+            self.controller.create_many([form for _, _, form in batch])
+        except Exception:  # pylint: disable=broad-except
+            current_app.logger.error(traceback.format_exc())
+        else:
+            return len(batch)
+        # find out the failed rows
+        imported = 0
+        for line, row, form in batch:
+            try:
+                self.controller.create_item(form)
+            except Exception as e:  # pylint: disable=broad-except
+                failed.append((line, row, {'': [str(e)]}))
+            else:
+                imported += 1
+        return imported
+
+    def import_done(self, form, imported, failed):
+        context = {
+            'form': form, 'imported': imported, 'failed': failed,
+            'format': form.format.data,
+        }
+        if failed:
+            # the report is the answer, html clients download it
+            return None, context
+        if not self.wants_json():
+            flash('Imported {} items.'.format(imported))
+        return url_for(self.success_url), context
+
+    def json_context(self, context):
+        if 'imported' not in context:
+            return super().json_context(context)
+        data = {
+            'imported': context['imported'],
+            'failed': [
+                {'line': line, 'errors': errors}
+                for line, _, errors in context['failed']
+            ],
+        }
+        return data, 200
+
+    def render_response(self, context):
+        if self.wants_json() or not context.get('failed'):
+            return super().render_response(context)
+        import_format = context['format']
+        writer = getattr(self, 'write_{}'.format(import_format))
+        filename = '{}-errors.{}'.format(
+            self.controller.absolute_name, import_format)
+        return Response(
+            writer(context['failed']),
+            mimetype=self.mimetypes[import_format],
+            headers={
+                'Content-Disposition':
+                    'attachment; filename="{}"'.format(filename),
+            },
+        )
+
+    # {{{ Readers
+    def read_csv(self, lines):
+        reader = csv.DictReader(lines)
+        for row in reader:
+            row.pop(None, None)  # values without a column
+            formdata = MultiDict(
+                (key, value) for key, value in row.items()
+                if value is not None)
+            yield reader.line_num, row, formdata
+
+    def read_jsonl(self, lines):
+        for line, text in enumerate(lines, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+                formdata = utils.json_to_formdata(row)
+            except ValueError:
+                yield line, text, None
+            else:
+                yield line, row, formdata
+    # }}}
+
+    # {{{ Writers
+    @staticmethod
+    def _format_errors(errors):
+        return '; '.join(
+            '{}: {}'.format(field, ', '.join(map(str, messages)))
+            if field else ', '.join(map(str, messages))
+            for field, messages in errors.items())
+
+    def write_csv(self, failed):
+        columns = {}  # the columns of every row, in order
+        for _, row, _ in failed:
+            columns.update(dict.fromkeys(row))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['line', 'errors', *columns])
+        for line, row, errors in failed:
+            writer.writerow([
+                line, self._format_errors(errors),
+                *(row.get(column, '') for column in columns)])
+        return buffer.getvalue()
+
+    def write_jsonl(self, failed):
+        return ''.join(
+            json.dumps({'line': line, 'errors': errors, 'row': row},
+                       default=str) + '\n'
+            for line, row, errors in failed)
+    # }}}
+
+
+class Choices(Component):
+    """Choices of a remote ``FieldFilter`` as json, in the select2 format.
+
+    Registered by the controller when it has remote filters.
+    """
+    role = Roles.list
+    url = 'choices/<name>/'
+    limit = 20
+
+    def is_allowed(self):
+        # not a role on its own, allowed to anyone allowed to list
+        roles = self.controller.get_roles()
+        return bool(roles.get(self.role.name))
+
+    def get(self, name):
+        filter_ = self.get_filter(name)
+        choices = filter_.search_choices(
+            request.args.get('q', ''), **self.get_slice())
+        return self.choices_context(choices)
+
+    def get_filter(self, name):
+        filter_ = self.controller.filters.get(name)
+        if filter_ is None or not getattr(filter_, 'remote', False):
+            abort(404)
+        return filter_
+
+    def get_slice(self):
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+        except ValueError:
+            abort(400)
+        # fetch one extra choice to know if there is more pages
+        return {'limit': self.limit + 1, 'offset': (page - 1) * self.limit}
+
+    def choices_context(self, choices):
+        return {
+            'results': [
+                {'id': value, 'text': title}
+                for value, title in choices[:self.limit]
+            ],
+            'pagination': {'more': len(choices) > self.limit},
+        }
+
+    def render_response(self, context):
+        return jsonify(
+            results=context['results'], pagination=context['pagination'])
+
+
+# {{{ Async
+class AsyncComponent(Component, views.AsyncView):
+    """A Component awaiting a ``AsyncController``."""
+
+    async def dispatch_request(self, *args, **kwargs):
+        try:
+            return await self._dispatch_request(*args, **kwargs)
+        finally:
+            # the next request runs in another event loop
+            await self.controller.close()
+
+    async def _dispatch_request(self, *args, **kwargs):
+        dispatch = views.AsyncView.dispatch_request
+        if self.server_timing:
+            timing.start(self)
+        with self.controller.track_queries(self.query_budget):
+            try:
+                if not self.is_allowed():
+                    abort(401)
+                if not self.is_conditional():
+                    return await dispatch(self, *args, **kwargs)
+                with timing.phase('validator'):
+                    etag, last_modified = await self.get_validator(
+                        *args, **kwargs)
+                etag = self.make_etag(etag, last_modified)
+                response = self.not_modified(etag, last_modified)
+                if response is None:
+                    response = make_response(
+                        await dispatch(self, *args, **kwargs))
+                    self.set_validator(response, etag, last_modified)
+                return response
+            except HTTPException as e:
+                return self.json_error(e)
+
+    async def get_validator(self, *args, **kwargs):
+        return None, None
+
+    async def get_item(self, pk):
+        item = await self.controller.get_item(pk)
+        if item is None:
+            abort(404)
+        return item
+
+
+class AsyncList(AsyncComponent, List):
+    async def get_validator(self):
+        return await self.controller.get_list_validator(filters=request.args)
+
+    async def get(self):
+        with timing.phase('items'):
+            items, total = await self.get_items()
+        if self.wants_json():
+            return {'items': items, 'total': total}
+        with timing.phase('filters'):
+            await self.controller.load_choices()
+        return self.list_context(items, total)
+
+    async def get_items(self):
+        order_by = request.args.get('order_by')
+        if self.controller.keyset_pagination:
+            try:
+                return await self.controller.get_items(
+                    order_by=order_by, filters=request.args,
+                    cursor=request.args.get('cursor'))
+            except ValueError:
+                abort(400)
+        page = int(request.args.get('page', 1))
+        return await self.controller.get_items(
+            page=page, order_by=order_by, filters=request.args)
+
+    async def post(self):
+        done = await self.controller.execute_action(self.get_form_data())
+        if done is False and self.wants_json():
+            abort(400)
+        return self.get_success_url(), {}
+
+
+class AsyncCreate(AsyncComponent, Create):
+    async def get(self):
+        return Create.get(self)
+
+    async def post(self):
+        form_data = self.get_form_data()
+        form = self.get_form(form_data)
+        success_url, item = None, None
+        if await self.controller.validate_form(form):
+            try:
+                item = await self.controller.create_item(form)
+            except Exception as e:  # pylint: disable=broad-except
+                current_app.logger.error(traceback.format_exc())
+                flash(str(e))
+            else:
+                success_url = self.get_success_url(form_data, item)
+        return success_url, {'form': form, 'item': item}
+
+
+class AsyncRead(AsyncComponent, Read):
+    async def get_validator(self, pk):
+        item = await self.get_item(pk)
+        return await self.controller.get_item_validator(item)
+
+    async def get(self, pk):
+        item = await self.get_item(pk)
+        return {'pk': pk, 'item': item}
+
+
+class AsyncUpdate(AsyncComponent, Update):
+    async def get_validator(self, pk):
+        item = await self.get_item(pk)
+        return await self.controller.get_item_validator(item)
+
+    async def get(self, pk):
+        item = await self.get_item(pk)
+        form = self.get_form(self.get_form_data(), obj=item)
+        return {'pk': pk, 'item': item, 'form': form}
+
+    async def post(self, pk):
+        form_data = self.get_form_data()
+        item = await self.get_item(pk)
+        form = self.get_form(form_data, obj=item)
+        success_url = None
+        if await self.controller.validate_form(form):
+            try:
+                await self.controller.update_item(item, form)
+            except Exception as e:  # pylint: disable=broad-except
+                current_app.logger.error(traceback.format_exc())
+                flash(str(e))
+            else:
+                success_url = self.get_success_url(form_data, item)
+        return success_url, {'pk': pk, 'item': item, 'form': form}
+
+
+class AsyncDelete(AsyncComponent, Delete):
+    async def get(self, pk):
+        item = await self.get_item(pk)
+        return {'pk': pk, 'item': item}
+
+    async def post(self, pk):
+        item = await self.get_item(pk)
+        success_url = None
+        try:
+            await self.controller.delete_item(item)
+        except Exception as e:  # pylint: disable=broad-except
+            current_app.logger.error(traceback.format_exc())
+            flash(str(e))
+        else:
+            success_url = url_for(self.success_url)
+        return success_url, {'pk': pk, 'item': item}
+
+
+class AsyncImport(AsyncComponent, Import):
+    async def get(self):
+        return Import.get(self)
+
+    async def post(self):
+        form = self.form_class(self.get_form_data())
+        rows = self.read_upload(form)
+        if rows is None:
+            return None, {'form': form}
+        imported, failed = await self.import_rows(rows)
+        return self.import_done(form, imported, failed)
+
+    async def import_rows(self, rows):
+        imported, failed, batch = 0, [], []
+        batch_size = self.controller.import_batch_size
+        for line, row, formdata in rows:
+            if formdata is None:
+                failed.append((line, row, {'': ['Invalid row.']}))
+                continue
+            form = self.get_form(formdata)
+            if not await self.controller.validate_form(form):
+                failed.append((line, row, form.errors))
+                continue
+            batch.append((line, row, form))
+            if len(batch) >= batch_size:
+                imported += await self.create_batch(batch, failed)
+                batch = []
+        if batch:
+            imported += await self.create_batch(batch, failed)
+        return imported, failed
+
+    async def create_batch(self, batch, failed):
+        try:
+            await self.controller.create_many([form for _, _, form in batch])
+        except Exception:  # pylint: disable=broad-except
+            current_app.logger.error(traceback.format_exc())
+        else:
+            return len(batch)
+        imported = 0
+        for line, row, form in batch:
+            try:
+                await self.controller.create_item(form)
+            except Exception as e:  # pylint: disable=broad-except
+                failed.append((line, row, {'': [str(e)]}))
+            else:
+                imported += 1
+        return imported
+
+
+class AsyncChoices(AsyncComponent, Choices):
+    async def get(self, name):
+        self.get_filter(name)
+        choices = await self.controller.search_choices(
+            name, request.args.get('q', ''), **self.get_slice())
+        return self.choices_context(choices)
+# }}}
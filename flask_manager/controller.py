@@ -1,8 +1,11 @@
-from collections import defaultdict
+from contextlib import nullcontext
+from types import MappingProxyType
+import inspect
 from cached_property import cached_property
 import wtforms
 
-from flask_manager import tree, components, utils
+from flask_manager import (
+    tree, components, utils, display_rules as display_rules_)
 
 
 class FakeSelectMultipleField(wtforms.fields.SelectMultipleField):
@@ -15,9 +18,15 @@ class Filter:
     def get_form_field(self, query):
         raise NotImplementedError
 
+    def update_form_field(self, field):
+        """Called with the bound field of every new filter form."""
+
     def filter(self, value, items):
         raise NotImplementedError
 
+    def warm(self):
+        """Fill the filter caches ahead of the first request."""
+
 
 # pylint: disable=abstract-method
 class SearchFilter(Filter):
@@ -26,15 +35,59 @@ class SearchFilter(Filter):
 
 
 class FieldFilter(Filter):
+    # remote filters do not embed the choices in the page, they are
+    # fetched on demand from a json endpoint, with ``search_choices``
+    remote = False
+
     def get_form_field(self):
-        choices = [('', 'All'), *list(self.get_choices())]
-        return wtforms.SelectField(choices=choices)
+        # choices are set by update_form_field, so the form class
+        # can be built once
+        return wtforms.SelectField(choices=[('', 'All')])
+
+    def update_form_field(self, field):
+        if not self.remote:
+            field.choices = [('', 'All'), *list(self.get_choices())]
+        elif field.data:
+            field.choices = [('', 'All'), (field.data, field.data)]
 
     def get_choices(self):
         raise NotImplementedError
 
+    def search_choices(self, term, limit, offset=0):
+        """Return up to ``limit`` choices starting with ``term``."""
+        raise NotImplementedError
+
+    def warm(self):
+        if not self.remote:
+            list(self.get_choices())
+
+
+class EstimatedTotal(int):
+    """A total of items estimated, instead of counted."""
+    estimated = True
+
+
+class KeysetPage(list):
+    """A page of items fetched with keyset pagination.
+
+    Args:
+        items (iterable): the items in the page.
+        next_cursor (Optional[str]): cursor to the page after this one.
+        prev_cursor (Optional[str]): cursor to the page before this one.
+    """
+
+    def __init__(self, items=(), next_cursor=None, prev_cursor=None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+_missing = object()
+
 
 class Controller(tree.Tree):
+    # serves the remote filters choices, if any
+    choices_component = components.Choices
     components = (
         components.List,
         components.Create,
@@ -47,12 +100,22 @@ class Controller(tree.Tree):
     actions = {}
     filters = {}
     per_page = 100
+    keyset_pagination = False
     form_class = None
+    # rows created by a single ``create_many``, in Import
+    import_batch_size = 1000
+    # cache the rendered rows, needs ``get_item_version``, which must
+    # change on every write, bulk ones too, the cache is per process
+    cache_fragments = False
+    # time the requests phases, see ``flask_manager.timing``
+    server_timing = False
 
     def __init__(self, *args, **kwargs):
         attribute_keys = (
             'components', 'decorators', 'display_rules',
-            'actions', 'filters', 'per_page', 'form_class'
+            'actions', 'filters', 'per_page', 'keyset_pagination',
+            'form_class', 'cache_fragments', 'import_batch_size',
+            'server_timing'
         )
         for key in filter(kwargs.__contains__, attribute_keys):
             setattr(self, key, kwargs.pop(key))
@@ -62,17 +125,51 @@ class Controller(tree.Tree):
         for component in self.components:
             yield self._component_name(component)
 
+    def all_display_rules(self):
+        yield from super().all_display_rules()
+        yield from self.display_rules.values()
+
     @cached_property
     def endpoint(self):
         return '.{}'.format(self._main_component_name())
 
+    @cached_property
+    def choices_endpoint(self):
+        return '.{}'.format(self._component_name(self.choices_component))
+
     def get_nodes(self):
         endpoint = '.{}'.format(self._main_component_name())
         for component in self.components:
             yield self._get_view(component, endpoint)
+        if self.get_remote_filters():
+            yield self._get_view(self.choices_component, endpoint)
+
+    def get_lazy_nodes(self):
+        """The nodes of a lazy ``Index``, the urls of ``get_nodes``,
+        whose views are built by their first request.
+        """
+        endpoint = '.{}'.format(self._main_component_name())
+        for component in self.components:
+            yield self._get_lazy_view(component, endpoint)
+        if self.get_remote_filters():
+            yield self._get_lazy_view(self.choices_component, endpoint)
+
+    def warm(self):
+        """Build the forms and fill the filters caches,
+        needs a app context.
+        """
+        super().warm()
+        self.get_action_form()
+        self.get_filter_form()
+        for filter_ in self.filters.values():
+            filter_.warm()
 
     # {{{ Actions Interface
     def get_action_form(self):
+        return self._action_form_class
+
+    @cached_property
+    def _action_form_class(self):
         class ActionsForm(wtforms.Form):
             action = wtforms.fields.SelectField(choices=[
                 (key, key.title()) for key in self.actions])
@@ -88,10 +185,22 @@ class Controller(tree.Tree):
 
     # {{{ Filter Interface
     def get_filter_form(self):
+        return self._filter_form_class
+
+    @cached_property
+    def _filter_form_class(self):
+        filters = self.filters
+
         class FilterForm(wtforms.Form):
-            for key, filter_ in self.filters.items():
+            for key, filter_ in filters.items():
                 vars()[key] = filter_.get_form_field()
                 del key, filter_
+
+            # pylint: disable=no-self-argument
+            def __init__(form, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for key, filter_ in filters.items():
+                    filter_.update_form_field(form[key])
         return FilterForm
 
     def get_filters(self, params):
@@ -100,15 +209,96 @@ class Controller(tree.Tree):
             for key, value in params.items()
             if value and key in self.filters
         ]
+
+    def get_remote_filters(self):
+        return [
+            key for key, filter_ in self.filters.items()
+            if getattr(filter_, 'remote', False)
+        ]
+
+    def normalize_filters(self, params):
+        """Return the active filters in a hashable, ordered form."""
+        return tuple(sorted(
+            (key, value)
+            for key, value in params.items()
+            if value and key in self.filters
+        ))
+    # }}}
+
+    # {{{ Validators Interface
+    def get_item_validator(self, item):
+        """Return ``(etag, last_modified)`` of ``item``, for conditional
+        GETs of Read and Update, either may be None.
+
+        ``etag`` is a str changed on every change of ``item``,
+        ``last_modified`` a datetime.
+        """
+        return None, None
+
+    def get_list_validator(self, filters=None):
+        """Return ``(etag, last_modified)`` of the items matching
+        ``filters``, for conditional GETs of List, cheaper to compute
+        than the page.
+        """
+        return None, None
+
+    def get_item_version(self, item):
+        """Return a str changed on every change of ``item``, the key of
+        its cached fragments, None to not cache them.
+        """
+        return None
+
+    def invalidate_fragments(self, pk=None):
+        """Drop the cached fragments of the item ``pk``, ( its ``id`` ),
+        or of every item if None, in this process only, the other
+        processes miss them by the new item version.
+        """
+        if self.cache_fragments:
+            display_rules_.fragment_cache.invalidate(self, pk)
+    # }}}
+
+    # {{{ Dirty fields
+    def get_changed_fields(self, item, form):
+        """Return the names of the ``form`` fields whose data differs
+        from ``item``, the only fields an update writes.
+        """
+        return {
+            name for name, value in form.data.items()
+            if getattr(item, name, _missing) != value
+        }
+
+    def populate_changed(self, item, form, fields=None):
+        """Write the ``form`` fields changed from ``item`` in it, or
+        ``fields`` if given, return their names.
+        """
+        if fields is None:
+            fields = self.get_changed_fields(item, form)
+        for name in fields:
+            form[name].populate_obj(item, name)
+        return fields
+    # }}}
+
+    # {{{ Query accounting
+    def track_queries(self, budget=False):
+        """Return a context manager counting the queries run inside it,
+        checked against the controller budget if ``budget``, a no-op
+        by default.
+        """
+        return nullcontext()
     # }}}
 
     # {{{ Auth
+    @utils.request_cached
     def get_roles(self):
-        roles = defaultdict(list)
+        """Return a read only ``{role name: tuple of endpoints}``, with
+        every role name, shared by the whole request.
+        """
+        roles = {role.name: [] for role in components.Roles}
         for component in self.components:
             role = self._component_name(component)
             roles[component.role.name].append(role)
-        return roles
+        return MappingProxyType({
+            key: tuple(value) for key, value in roles.items()})
     # }}}
 
     # {{{ Helpers
@@ -136,11 +326,33 @@ class Controller(tree.Tree):
         view = component.as_view(
             name, controller=self, view_name=name, success_url=endpoint)
         return url, name, self._decorate_view(view)
+
+    def _get_lazy_view(self, component, endpoint):
+        url = utils.concat_urls(self.absolute_url, component.url)
+        name = self._component_name(component)
+        view = None
+
+        def lazy_view(**kwargs):
+            nonlocal view
+            if view is None:
+                # a race builds it twice, both are the same view
+                _, _, view = self._get_view(component, endpoint)
+            return view(**kwargs)
+        return url, name, lazy_view
     # }}}
 
     # {{{ Controller Interface
-    def get_items(self, page=1, order_by=None, filters=None):
-        """Return a paginated list of columns."""
+    def get_items(self, page=1, order_by=None, filters=None, cursor=None):
+        """Return a paginated list of columns.
+
+        When ``keyset_pagination`` is set, ``cursor`` is used instead of
+        ``page`` and the items must be a ``KeysetPage``. The total may be
+        None when it is unknown.
+        """
+        raise NotImplementedError
+
+    def iter_items(self, order_by=None, filters=None):
+        """Return a iterator over all items matching, unpaginated."""
         raise NotImplementedError
 
     def get_item(self, pk):
@@ -151,6 +363,12 @@ class Controller(tree.Tree):
         """Create a new entry in the storage."""
         raise NotImplementedError
 
+    def create_many(self, forms):
+        """Create a entry for each of the validated ``forms``, all or
+        none, faster than ``create_item`` for each.
+        """
+        raise NotImplementedError
+
     def update_item(self, item, form):
         """Update a entry in storage."""
         raise NotImplementedError
@@ -161,6 +379,92 @@ class Controller(tree.Tree):
     # }}}
 
 
+class AsyncController(Controller):
+    """A Controller whose interface methods are coroutines, served by
+    the async components, so the I/O of a request can overlap, like
+    the count and the page, the request still holds a worker thread,
+    flask runs each async view in a event loop of its own.
+
+    Forms, filters and rendering stay synchronous, anything they read
+    must be loaded by the coroutines.
+    """
+    choices_component = components.AsyncChoices
+    components = (
+        components.AsyncList,
+        components.AsyncCreate,
+        components.AsyncRead,
+        components.AsyncUpdate,
+        components.AsyncDelete
+    )
+
+    def warm(self):
+        # the choices are loaded by load_choices, inside a request
+        tree.Tree.warm(self)
+        self.get_action_form()
+        self.get_filter_form()
+
+    # {{{ Actions Interface
+    async def execute_action(self, params):
+        form = self.get_action_form()(params)
+        if not form.validate():
+            return False
+        result = self.actions[form.action.data](self, form.ids.data)
+        if inspect.isawaitable(result):
+            await result
+    # }}}
+
+    # {{{ Validators Interface
+    async def get_item_validator(self, item):
+        return None, None
+
+    async def get_list_validator(self, filters=None):
+        return None, None
+    # }}}
+
+    # {{{ Async Interface
+    async def validate_form(self, form):
+        """Validate ``form``, for validators doing I/O."""
+        return form.validate()
+
+    async def load_choices(self):
+        """Load the filters choices, before the filter form is built."""
+
+    async def search_choices(self, name, term, limit, offset=0):
+        """``search_choices`` of the remote filter ``name``."""
+        return self.filters[name].search_choices(term, limit, offset)
+
+    async def close(self):
+        """Release what the request held, called at its end, in its
+        event loop.
+        """
+    # }}}
+
+    # {{{ Controller Interface
+    async def get_items(self, page=1, order_by=None, filters=None,
+                        cursor=None):
+        raise NotImplementedError
+
+    def iter_items(self, order_by=None, filters=None):
+        # Export streams from a sync generator, not served here
+        raise NotImplementedError
+
+    async def get_item(self, pk):
+        raise NotImplementedError
+
+    async def create_item(self, form):
+        raise NotImplementedError
+
+    async def create_many(self, forms):
+        raise NotImplementedError
+
+    async def update_item(self, item, form):
+        raise NotImplementedError
+
+    async def delete_item(self, item):
+        raise NotImplementedError
+    # }}}
+
+
 class ViewNode(tree.Tree):
     def __init__(self, view_func, name=None, url=None):
         if name is None:
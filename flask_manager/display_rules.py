@@ -1,17 +1,206 @@
-from functools import lru_cache
+from collections import OrderedDict, defaultdict
+import threading
+import weakref
 
 from flask import current_app
-from jinja2 import Markup
+from jinja2 import Markup, escape
+
+
+class TemplateCache:
+    """A bounded LRU cache of templates and their macros,
+    keyed by jinja environment ( one per app ) and template name.
+
+    When the environment ``auto_reload`` is set, stale templates are
+    reloaded and ``generation`` is increased, so anything built from
+    them knows it must be rebuilt.
+
+    Args:
+        max_size (int): max number of templates kept.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.generation = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_entry(self, env, template_name):
+        if isinstance(template_name, list):
+            template_name = tuple(template_name)
+        key = (env, template_name)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and env.auto_reload and \
+                    not entry[0].is_up_to_date:
+                del self._cache[key]
+                self.generation += 1
+                entry = None
+            if entry is None:
+                template = env.get_or_select_template(template_name)
+                entry = self._cache[key] = (template, {})
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+            self._cache.move_to_end(key)
+            return entry
+
+    def get_template(self, env, template_name):
+        template, _ = self._get_entry(env, template_name)
+        return template
+
+    def get_macro(self, env, template_name, macro_name):
+        template, macros = self._get_entry(env, template_name)
+        try:
+            return macros[macro_name]
+        except KeyError:
+            macro = macros[macro_name] = getattr(template.module, macro_name)
+            return macro
+
+    def invalidate(self, env=None):
+        """Drop the templates of ``env``, or everything if None."""
+        with self._lock:
+            for key in list(self._cache):
+                if env is None or key[0] is env:
+                    del self._cache[key]
+            self.generation += 1
+
+
+class FragmentCache:
+    """A bounded LRU cache of rendered html, by owner ( a controller ),
+    item pk, and a key of everything else the html depends on.
+
+    Args:
+        max_size (int): max number of fragments kept.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._keys = defaultdict(set)  # (owner, pk) -> cached keys
+        self._lock = threading.Lock()
+
+    def get(self, owner, pk, key):
+        with self._lock:
+            html = self._cache.get((owner, pk, key))
+            if html is not None:
+                self._cache.move_to_end((owner, pk, key))
+            return html
+
+    def set(self, owner, pk, key, html):
+        with self._lock:
+            self._cache[(owner, pk, key)] = html
+            self._keys[(owner, pk)].add(key)
+            while len(self._cache) > self.max_size:
+                (old_owner, old_pk, old_key), _ = self._cache.popitem(
+                    last=False)
+                self._discard(old_owner, old_pk, old_key)
+
+    def _discard(self, owner, pk, key):
+        keys = self._keys[(owner, pk)]
+        keys.discard(key)
+        if not keys:
+            del self._keys[(owner, pk)]
+
+    def invalidate(self, owner=None, pk=None):
+        """Drop the fragments of item ``pk`` of ``owner``, all of
+        ``owner`` if ``pk`` is None, or everything if both are None.
+        """
+        with self._lock:
+            if pk is not None:
+                for key in self._keys.pop((owner, pk), ()):
+                    del self._cache[(owner, pk, key)]
+                return
+            for entry in list(self._cache):
+                if owner is None or entry[0] is owner:
+                    del self._cache[entry]
+                    self._discard(*entry)
+
+
+template_cache = TemplateCache()
+fragment_cache = FragmentCache()
 
 
-@lru_cache()
 def get_template(template_name):
-    return current_app.jinja_env.get_or_select_template(template_name)
+    return template_cache.get_template(current_app.jinja_env, template_name)
+
+
+def warm(rules):
+    """Resolve the macros and compile ``rules`` ahead of the first
+    request, needs a app context.
+    """
+    for rule in rules:
+        warm_rule = getattr(rule, 'warm', None)
+        if warm_rule is not None:
+            warm_rule()
+
+
+def get_field_value(obj, field_name):
+    """Read ``field_name`` from a object or a mapping."""
+    try:
+        return getattr(obj, field_name)
+    except AttributeError:
+        return obj[field_name]
+
+
+def iter_field_names(rule):
+    """Yield the names of the fields read by ``rule`` and its children."""
+    yield from getattr(rule, 'fields', ())
+    for child in getattr(rule, 'rules', ()):
+        yield from iter_field_names(child)
+    child = getattr(rule, 'child_rule', None)
+    if child is not None:
+        yield from iter_field_names(child)
+
+
+class Probe:
+    """A stand-in for the arguments of a macro, to find out how the
+    macro uses them, any use other than ``{{ probe }}`` is recorded
+    in ``touched``.
+    """
+
+    def __init__(self, marker=None):
+        self.marker = marker
+        self.touched = False
+
+    def _touch(self, *args, **kwargs):
+        self.touched = True
+        return self
+
+    def __html__(self):
+        if self.marker is None:
+            self._touch()
+            return ''
+        return self.marker
+
+    def __getattr__(self, name):
+        return self._touch()
+
+    __getitem__ = __call__ = __eq__ = _touch
+    __hash__ = object.__hash__
+
+    def __str__(self):
+        self._touch()
+        return ''
+
+    def __format__(self, spec):
+        return str(self)
+
+    def __bool__(self):
+        self._touch()
+        return True
+
+    def __iter__(self):
+        self._touch()
+        return iter(())
+
+    def __len__(self):
+        self._touch()
+        return 0
 
 
 class Macro:
     template_name = None
     macro_name = None
+    fields = ()  # names of the obj fields the macro reads
 
     def __init__(self, template_name=None, macro_name=None, **kwargs):
         if template_name is not None:
@@ -21,8 +210,12 @@ class Macro:
         self.kwargs = kwargs
 
     def _resolve(self):
-        template = get_template(self.template_name)
-        return getattr(template.module, self.macro_name)
+        return template_cache.get_macro(
+            current_app.jinja_env, self.template_name, self.macro_name)
+
+    def warm(self):
+        if self.template_name is not None and self.macro_name is not None:
+            self._resolve()
 
     def __call__(self, obj, **kwargs):
         macro = self._resolve()
@@ -40,6 +233,9 @@ class Nested:
     def __call__(self, obj, **kwargs):
         return Markup(''.join(rule(obj) for rule in self.rules))
 
+    def warm(self):
+        warm(self.rules)
+
 
 class Container(Macro):
     """Container(Macro(...))()"""
@@ -53,6 +249,10 @@ class Container(Macro):
             return self.child_rule(obj)
         return super().__call__(obj, caller=caller, **kwargs)
 
+    def warm(self):
+        super().warm()
+        warm([self.child_rule])
+
 
 # {{{ FieldMacros
 class CellField(Macro):
@@ -62,15 +262,50 @@ class CellField(Macro):
 
     def __init__(self, field_name, **kwargs):
         self.field_name = field_name
+        self.fields = (field_name, )
         super().__init__(**kwargs)
 
     def __call__(self, obj):
-        try:
-            value = getattr(obj, self.field_name)
-        except AttributeError:
-            value = obj[self.field_name]
+        value = get_field_value(obj, self.field_name)
         return super().__call__(obj, name=self.field_name, value=value)
 
+    # rendered by ``compile`` to check the macro html does not depend on
+    # the value, like a ``value is none`` test, which a probe can not see
+    compile_samples = (None, '', 'a <b>', 0, -1.5, True, False)
+
+    def compile(self):
+        """Split the macro output around the field value.
+
+        Returns:
+            (tuple): the html before and after ``{{ value }}``,
+                None if the macro uses ``obj`` or ``value`` for anything
+                else than ``{{ value }}``, and must be called.
+        """
+        marker = '\x00value\x00'
+        obj = Probe()
+        html = self._render_probe(obj, Probe(marker))
+        if html is None or html.count(marker) != 1:
+            return None
+        prefix, suffix = html.split(marker)
+        # the same html around any other value, or the macro tests it
+        for value in (Probe('\x00other\x00'), *self.compile_samples):
+            html = self._render_probe(obj, value)
+            if html != prefix + str(escape(value)) + suffix:
+                return None
+        if obj.touched:
+            return None
+        return prefix, suffix
+
+    def _render_probe(self, obj, value):
+        try:
+            html = str(super().__call__(
+                obj, name=self.field_name, value=value))
+        except Exception:  # pylint: disable=broad-except
+            return None
+        if isinstance(value, Probe) and value.touched:
+            return None
+        return html
+
 
 class DataField(CellField):
     """Render a field in Read/Delete."""
@@ -85,14 +320,72 @@ class FormField(CellField):
 
 # {{{ RowContainers
 class ColumnSet(Nested):
-    """ColumnSet([name for name in model])(Model())"""
+    """ColumnSet([name for name in model])(Model())
+
+    With ``compiled``, the fields macros are compiled once per jinja
+    environment, rows are rendered by joining the compiled html with the
+    escaped values, fields which can not be compiled call their macro.
+    Only for macros whose html depends on nothing but ``{{ value }}``,
+    a macro using the value otherwise, like ``value is none``, is found
+    by rendering it with sample values, and called, but one reading the
+    request, ``g``, the user or the time is rendered once for all rows
+    and requests.
+    """
     field_class = CellField
+    compiled = False
 
-    def __init__(self, columns):
+    def __init__(self, columns, compiled=None):
+        if compiled is not None:
+            self.compiled = compiled
         rules = [self.field_class(column) for column in columns]
         self.columns = columns
+        self._template_names = {rule.template_name for rule in rules}
+        self._compiled = weakref.WeakKeyDictionary()
         super().__init__(rules=rules)
 
+    def compile(self):
+        """Return a list of ``(field_name, prefix, suffix)`` or ``rule``."""
+        compiled = []
+        for rule in self.rules:
+            parts = rule.compile()
+            if parts is None:
+                compiled.append(rule)
+            else:
+                compiled.append((rule.field_name, *parts))
+        return compiled
+
+    def _get_compiled(self):
+        env = current_app.jinja_env
+        if env.auto_reload:
+            # let template_cache notice a changed template
+            for template_name in self._template_names:
+                template_cache.get_template(env, template_name)
+        generation, compiled = self._compiled.get(env, (None, None))
+        if generation != template_cache.generation:
+            generation = template_cache.generation
+            compiled = self.compile()
+            self._compiled[env] = generation, compiled
+        return compiled
+
+    def warm(self):
+        if not self.compiled:
+            return super().warm()
+        self._get_compiled()
+
+    def __call__(self, obj, **kwargs):
+        if not self.compiled:
+            return super().__call__(obj, **kwargs)
+        compiled = self._get_compiled()
+        html = []
+        for part in compiled:
+            if isinstance(part, tuple):
+                field_name, prefix, suffix = part
+                value = get_field_value(obj, field_name)
+                html.extend((prefix, escape(value), suffix))
+            else:
+                html.append(part(obj))
+        return Markup(''.join(html))
+
 
 class DataFieldSet(ColumnSet):
     field_class = DataField
@@ -0,0 +1,279 @@
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
+import time
+from cached_property import cached_property
+from wtforms_alchemy import ModelForm
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
+from sqlalchemy import orm
+import sqlalchemy as sa
+
+from flask_manager import controller, timing
+from flask_manager.ext.sqlalchemy import (
+    SQLAlchemyController, FieldFilter, get_changed_keys, _is_private_sqlite)
+
+
+@asynccontextmanager
+async def transaction(db_session):
+    try:
+        yield db_session
+        await db_session.commit()
+    except Exception:
+        await db_session.rollback()
+        raise
+
+
+class AsyncSQLAlchemyController(controller.AsyncController,
+                                SQLAlchemyController):
+    """A SQLAlchemyController awaiting a ``AsyncSession``, or a
+    ``async_scoped_session``, in ``db_session``.
+
+    Queries are built like in ``SQLAlchemyController``, without a
+    session, and run with ``AsyncSession.run_sync``, so filters, count
+    strategies and pagination are shared, and the database I/O is
+    awaited.
+
+    Items are rendered after the coroutines return, so the
+    relationships read by the display rules must be eager loaded,
+    as planned by ``get_load_options``, and the session must be made
+    with ``expire_on_commit=False``.
+
+    Flask runs each async view in a event loop of its own, so a pooled
+    connection can not be reused by the next request, the engine must
+    be made with ``poolclass=NullPool``, and the session is closed, or
+    removed, at the end of each request, in its loop, by ``close``.
+
+    The filters have no session, their choices are loaded with
+    ``run_sync`` by ``load_choices``, before the filter form is built.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # a AsyncSession can not query, the choices are loaded by
+        # load_choices and search_choices, with the sync session
+        for filter_ in self.filters.values():
+            filter_.db_session = None
+
+    # {{{ Generated from model_class
+    @cached_property
+    def form_class(self):
+        class Form(ModelForm):
+            @classmethod
+            def get_session(cls):
+                # validators query inside validate_form
+                return self.get_session().sync_session
+
+            class Meta:
+                model = self.model_class
+        return Form
+    # }}}
+
+    # {{{ Helpers
+    def get_session(self):
+        if isinstance(self.db_session, async_scoped_session):
+            return self.db_session()
+        return self.db_session
+
+    def get_query(self):
+        # bound to a session by run_sync
+        return orm.Query(self.model_class)
+
+    def get_engine(self):
+        return self.get_session().sync_session.get_bind(
+            sa.inspect(self.model_class))
+
+    async def run_sync(self, func, *args, **kwargs):
+        """Await ``func(session, *args, **kwargs)``, called with the
+        sync session, where the ORM can be used.
+        """
+        return await self.get_session().run_sync(func, *args, **kwargs)
+
+    async def all(self, query):
+        return await self.run_sync(
+            lambda session: query.with_session(session).all())
+
+    async def save(self, item):
+        keys = get_changed_keys(item)
+        pk = getattr(item, 'id', None)
+        async with transaction(self.get_session()) as session:
+            session.add(item)
+            self._bump_version(session, [item])
+        self.on_change(keys)
+        if pk is not None:
+            self.invalidate_fragments(pk)
+        return item
+
+    async def delete(self, item):
+        pk = getattr(item, 'id', None)
+        async with transaction(self.get_session()) as session:
+            await session.delete(item)
+        self.on_change()
+        if pk is not None:
+            self.invalidate_fragments(pk)
+
+    async def count(self, query, filters=None):
+        normalized = self.normalize_filters(filters or {})
+        with timing.phase('count'):
+            return await self.run_sync(lambda session: self.count_strategy(
+                self, query.with_session(session), normalized))
+
+    def count_later(self, query, filters=None):
+        """Start counting, return a coroutine function waiting for the
+        total, with ``concurrent_count`` the count runs in a session of
+        its own, and is canceled after ``count_timeout`` seconds.
+        """
+        if not self.concurrent_count or _is_private_sqlite(self.get_engine()):
+            return partial(self.count, query, filters)
+        normalized = self.normalize_filters(filters or {})
+        task = asyncio.ensure_future(self._count_apart(query, normalized))
+        started = time.monotonic()
+
+        async def wait():
+            timeout = self.count_timeout
+            if timeout is not None:
+                timeout = max(0, started + timeout - time.monotonic())
+            try:
+                with timing.phase('count'):
+                    return await asyncio.wait_for(task, timeout)
+            except (asyncio.TimeoutError, sa.exc.OperationalError):
+                return None
+        return wait
+
+    async def _count_apart(self, query, filters):
+        async with AsyncSession(bind=self.get_session().bind) as session:
+            return await session.run_sync(
+                lambda sync_session: self.count_strategy(
+                    self, query.with_session(sync_session), filters))
+    # }}}
+
+    # {{{ Validators Interface
+    async def get_item_validator(self, item):
+        return SQLAlchemyController.get_item_validator(self, item)
+
+    async def get_list_validator(self, filters=None):
+        if self.version_column is None:
+            return None, None
+        query = self.get_query()
+        if filters is not None:
+            query = self._filter(query, filters)
+        return await self.run_sync(
+            lambda session: self._list_validator(query.with_session(session)))
+    # }}}
+
+    # {{{ Async Interface
+    async def validate_form(self, form):
+        return await self.run_sync(lambda session: form.validate())
+
+    async def load_choices(self):
+        for filter_ in self.filters.values():
+            if isinstance(filter_, FieldFilter) and not filter_.remote:
+                await self.run_sync(filter_.get_choices)
+
+    async def search_choices(self, name, term, limit, offset=0):
+        filter_ = self.filters[name]
+        return await self.run_sync(
+            lambda session: filter_.search_choices(
+                term, limit, offset, session=session))
+
+    async def close(self):
+        if isinstance(self.db_session, async_scoped_session):
+            await self.db_session.remove()
+        else:
+            await self.db_session.close()
+    # }}}
+
+    # {{{ Bulk Interface
+    async def get_many(self, ids):
+        column, chunks = self._pk_chunks(ids)
+        for chunk in chunks:
+            yield await self.all(self.get_query().filter(column.in_(chunk)))
+
+    async def run_batched(self, ids, func):
+        async for items in self.get_many(ids):
+            async with transaction(self.get_session()) as session:
+                func(self, items)
+                self._bump_version(session, items)
+        self.on_change()
+        self.invalidate_fragments()
+
+    async def update_many(self, ids, values):
+        values = self._versioned(values)
+        column, chunks = self._pk_chunks(ids)
+        async with transaction(self.get_session()) as session:
+            for chunk in chunks:
+                await session.execute(
+                    sa.update(self.model_class).where(
+                        column.in_(chunk)).values(values).execution_options(
+                            synchronize_session=False))
+        self.on_change({getattr(key, 'key', key) for key in values})
+        self.invalidate_fragments()
+
+    async def delete_many(self, ids):
+        column, chunks = self._pk_chunks(ids)
+        async with transaction(self.get_session()) as session:
+            for chunk in chunks:
+                await session.execute(
+                    sa.delete(self.model_class).where(
+                        column.in_(chunk)).execution_options(
+                            synchronize_session=False))
+        self.on_change()
+        self.invalidate_fragments()
+    # }}}
+
+    # {{{ Controller Interface
+    async def get_items(self, page=1, order_by=None, filters=None,
+                        cursor=None):
+        """The coroutine of ``SQLAlchemyController.get_items``,
+        returns the items in a list.
+        """
+        options = self.get_load_options('list')
+        if self.keyset_pagination:
+            query = self.get_query()
+            if filters is not None:
+                query = self._filter(query, filters)
+            total = self.count_later(query, filters)
+            page = await self.run_sync(
+                lambda session: self._get_keyset_page(
+                    query.with_session(session), order_by, cursor, options))
+            return page, await total()
+        start = (page-1)*self.per_page
+        query = self.get_query()
+        if order_by is not None:
+            query = query.order_by(self._get_field(order_by))
+        if filters is not None:
+            query = self._filter(query, filters)
+        total = self.count_later(query, filters)
+        items = self._project(query, options=options)
+        items = await self.all(items.offset(start).limit(self.per_page))
+        return items, await total()
+
+    async def get_item(self, pk):
+        options = self.get_load_options('read', 'update', 'delete')
+        return await self.get_session().get(
+            self.model_class, pk, options=options)
+
+    async def create_item(self, form):
+        item = self.new()
+        return await self.update_item(item, form)
+
+    async def create_many(self, forms):
+        items = self._populate_many(forms)
+        async with transaction(self.get_session()) as session:
+            await session.run_sync(
+                lambda sync_session: sync_session.bulk_save_objects(items))
+        self.on_change()
+        return items
+
+    async def update_item(self, item, form):
+        state = sa.inspect(item)
+        if state.transient or state.pending:
+            form.populate_obj(item)
+            return await self.save(item)
+        self.populate_changed(item, form)
+        if not get_changed_keys(item):
+            return item
+        return await self.save(item)
+
+    async def delete_item(self, item):
+        return await self.delete(item)
+    # }}}
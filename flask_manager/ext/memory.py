@@ -0,0 +1,515 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+from numbers import Number
+import heapq
+import os
+import threading
+
+from flask_manager import controller, display_rules
+
+
+class Record(dict):
+    """A dict with attribute access, wtforms ``populate_obj`` and the
+    templates use attributes.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    __setattr__ = dict.__setitem__
+    __delattr__ = dict.__delitem__
+
+
+def get_field_value(item, field):
+    """Read ``field`` from ``item``, None if it has no such field."""
+    try:
+        return display_rules.get_field_value(item, field)
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def sort_key(value):
+    # None sorts last, other values are grouped by type, numbers
+    # together, so values of different types are never compared
+    if value is None:
+        return (True, )
+    group = '' if isinstance(value, Number) else type(value).__name__
+    return (False, group, value)
+
+
+def _snapshot(item):
+    return dict(item if isinstance(item, dict) else vars(item))
+
+
+def _restore(item, snapshot):
+    fields = item if isinstance(item, dict) else vars(item)
+    fields.clear()
+    fields.update(snapshot)
+
+
+class MemoryStorage:
+    """Items kept in a dict by primary key, with indexes updated on
+    every insert, update and delete.
+
+    Hash indexes map a field value to the set of pks with it, sorted
+    indexes are lists of ``(sort_key(value), pk)``, the pk field always
+    has one, it is the default order.
+
+    ``version`` is increased on every change, and ``versions`` has the
+    version of the last change of each item.
+
+    Args:
+        pk_field (str): the field with the primary key.
+        pk_type (callable): converts the url pk to a storage pk.
+    """
+
+    def __init__(self, pk_field='id', pk_type=int):
+        self.pk_field = pk_field
+        self.pk_type = pk_type
+        self.next_pk = 1
+        self.items = {}
+        self.hash_indexes = {}
+        self.sorted_indexes = {}
+        self.lock = threading.RLock()
+        # tells apart the storages of different processes
+        self.token = os.urandom(4).hex()
+        self.version = 0
+        self.versions = {}
+        self.add_sorted_index(pk_field)
+
+    # {{{ Indexes
+    def add_hash_index(self, field):
+        with self.lock:
+            if field in self.hash_indexes:
+                return
+            index = self.hash_indexes[field] = defaultdict(set)
+            for pk, item in self.items.items():
+                index[get_field_value(item, field)].add(pk)
+
+    def add_sorted_index(self, field):
+        with self.lock:
+            if field in self.sorted_indexes:
+                return
+            self.sorted_indexes[field] = sorted(
+                (sort_key(get_field_value(item, field)), pk)
+                for pk, item in self.items.items())
+
+    def _values(self, item):
+        fields = set(self.hash_indexes) | set(self.sorted_indexes)
+        return {field: get_field_value(item, field) for field in fields}
+
+    def _index(self, pk, values):
+        """Add ``pk`` to the indexes of ``values``, all or none, a value
+        that can not be hashed or sorted raises ``TypeError``.
+        """
+        done = {}
+        try:
+            for field, value in values.items():
+                if field in self.hash_indexes:
+                    hash(value)
+                if field in self.sorted_indexes:
+                    insort(self.sorted_indexes[field], (sort_key(value), pk))
+                if field in self.hash_indexes:
+                    self.hash_indexes[field][value].add(pk)
+                done[field] = value
+        except BaseException:
+            self._unindex(pk, done)
+            raise
+
+    def _touch(self, pk):
+        self.version += 1
+        self.versions[pk] = self.version
+
+    def _unindex(self, pk, values):
+        for field, value in values.items():
+            if field in self.hash_indexes:
+                index = self.hash_indexes[field]
+                index[value].discard(pk)
+                if not index[value]:
+                    del index[value]
+            if field in self.sorted_indexes:
+                index = self.sorted_indexes[field]
+                del index[bisect_left(index, (sort_key(value), pk))]
+    # }}}
+
+    # {{{ Changes
+    def get(self, pk):
+        try:
+            return self.items.get(self.pk_type(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def insert(self, item):
+        """Add ``item``, setting its pk if it has none."""
+        with self.lock:
+            pk = getattr(item, self.pk_field, None)
+            if pk is None:
+                pk = self.next_pk
+            if pk in self.items:
+                raise KeyError('duplicated pk: {}'.format(pk))
+            self._index(pk, {**self._values(item), self.pk_field: pk})
+            setattr(item, self.pk_field, pk)
+            if isinstance(pk, int) and pk >= self.next_pk:
+                self.next_pk = pk + 1
+            self.items[pk] = item
+            self._touch(pk)
+        return item
+
+    def insert_many(self, items):
+        """Add ``items``, all or none."""
+        with self.lock:
+            pks = set()
+            for item in items:
+                pk = getattr(item, self.pk_field, None)
+                if pk is None:
+                    continue
+                if pk in self.items or pk in pks:
+                    raise KeyError('duplicated pk: {}'.format(pk))
+                pks.add(pk)
+            # explicit pks first, the others are numbered after them
+            items = sorted(
+                items, key=lambda item: getattr(
+                    item, self.pk_field, None) is None)
+            for item in items:
+                self.insert(item)
+        return items
+
+    @contextmanager
+    def updating(self, item):
+        """Reindex the fields of ``item`` changed inside the block, if
+        the block or the reindex raises, the fields of ``item`` and the
+        indexes are restored.
+
+        Example:
+            with storage.updating(item):
+                form.populate_obj(item)
+        """
+        with self.lock:
+            pk = getattr(item, self.pk_field)
+            old = self._values(item)
+            snapshot = _snapshot(item)
+            try:
+                yield item
+                new = self._values(item)
+                new_pk = new[self.pk_field]
+                if new_pk is None:
+                    raise ValueError('missing pk')
+                if new_pk != pk and new_pk in self.items:
+                    raise KeyError('duplicated pk: {}'.format(new_pk))
+                # a new pk moves every index entry
+                changed = [
+                    field for field in new
+                    if new_pk != pk or new[field] != old[field]]
+                self._unindex(pk, {field: old[field] for field in changed})
+                try:
+                    self._index(
+                        new_pk, {field: new[field] for field in changed})
+                except BaseException:
+                    self._index(pk, {field: old[field] for field in changed})
+                    raise
+            except BaseException:
+                _restore(item, snapshot)
+                raise
+            if new_pk != pk:
+                del self.items[pk]
+                del self.versions[pk]
+                self.items[new_pk] = item
+                if isinstance(new_pk, int) and new_pk >= self.next_pk:
+                    self.next_pk = new_pk + 1
+            self._touch(new_pk)
+
+    def delete(self, pk):
+        with self.lock:
+            item = self.items.pop(pk)
+            self._unindex(pk, self._values(item))
+            self._touch(pk)
+            del self.versions[pk]
+    # }}}
+
+    # {{{ Reads
+    def select(self, query, order_by=None, start=0, stop=None):
+        """Return a page of the items matching ``query``, and the total.
+
+        Only the items in the page are collected: without filters the
+        sorted index is sliced, small results are ordered with a heap,
+        and big ones by walking the sorted index.
+
+        Args:
+            query (Query): the items to select.
+            order_by (str): field to order by, ``-field`` for descending,
+                fields without a sorted index are sorted on every call.
+            start (int): index of the first item.
+            stop (int): index after the last item, None for all.
+
+        Returns:
+            tuple with:
+                a list with the items in the page
+                the total of items matching
+        """
+        field, descending = self.pk_field, False
+        if order_by:
+            field, descending = order_by.lstrip('-'), order_by[0] == '-'
+        with self.lock:
+            pks = query.pks()
+            total = len(self.items) if pks is None else len(pks)
+            page = self._slice(pks, field, descending, start, stop)
+            return [self.items[pk] for pk in page], total
+
+    def _slice(self, pks, field, descending, start, stop):
+        index = self.sorted_indexes.get(field)
+        if index is None:
+            def key(pk):
+                return sort_key(get_field_value(self.items[pk], field)), pk
+            candidates = self.items if pks is None else pks
+            ordered = sorted(candidates, key=key, reverse=descending)
+            return ordered[start:stop]
+        if pks is None:
+            if descending:
+                index = reversed(index)
+            return [pk for _, pk in islice(index, start, stop)]
+        if stop is not None and len(pks) * 4 < len(index):
+            entries = [
+                (sort_key(get_field_value(self.items[pk], field)), pk)
+                for pk in pks]
+            select = heapq.nlargest if descending else heapq.nsmallest
+            return [pk for _, pk in select(stop, entries)][start:]
+        if descending:
+            index = reversed(index)
+        matching = (pk for _, pk in index if pk in pks)
+        return list(islice(matching, start, stop))
+    # }}}
+
+
+class Query:
+    """A lazy selection of ``storage`` items.
+
+    ``filter_by`` conditions are served by the hash indexes, and
+    combined by intersecting their sets, smallest first, ``filter``
+    predicates are checked only on the items left.
+    """
+
+    def __init__(self, storage, conditions=(), predicates=()):
+        self.storage = storage
+        self.conditions = conditions
+        self.predicates = predicates
+
+    def filter_by(self, field, value):
+        conditions = (*self.conditions, (field, value))
+        return Query(self.storage, conditions, self.predicates)
+
+    def filter(self, predicate):
+        predicates = (*self.predicates, predicate)
+        return Query(self.storage, self.conditions, predicates)
+
+    def pks(self):
+        """Return the set of pks matching, None if all the items match."""
+        items = self.storage.items
+        matches = []
+        for field, value in self.conditions:
+            index = self.storage.hash_indexes.get(field)
+            if index is None:
+                matches.append({
+                    pk for pk, item in items.items()
+                    if get_field_value(item, field) == value})
+            else:
+                matches.append(index.get(value, frozenset()))
+        pks = None
+        if matches:
+            matches.sort(key=len)
+            pks = set(matches[0]).intersection(*matches[1:])
+        if self.predicates:
+            pks = {
+                pk for pk in (items if pks is None else pks)
+                if all(predicate(items[pk]) for predicate in self.predicates)
+            }
+        return pks
+
+    def count(self):
+        pks = self.pks()
+        return len(self.storage.items) if pks is None else len(pks)
+
+
+class SearchFilter(controller.SearchFilter):
+    """Case insensitive search of ``value`` in any of ``fields``,
+    checked on the items left by the indexed filters.
+    """
+
+    def __init__(self, fields):
+        self.storage = None  # injected by MemoryController.__init__
+        self.fields = fields
+        self.join_tables = None
+
+    def filter(self, value, query):
+        value = value.casefold()
+
+        def predicate(item):
+            return any(
+                value in str(get_field_value(item, field)).casefold()
+                for field in self.fields)
+        return query.filter(predicate)
+
+
+class FieldFilter(controller.FieldFilter):
+    """Filter by ``field`` value, served by a hash index.
+
+    Args:
+        field (str): the field name.
+        coerce (callable): converts the form value to the field value.
+        remote (bool): fetch the choices on demand, by prefix.
+    """
+
+    def __init__(self, field, coerce=str, remote=False):
+        self.storage = None  # injected by MemoryController.__init__
+        self.field = field
+        self.coerce = coerce
+        self.remote = remote
+        self.join_tables = None
+
+    def filter(self, value, query):
+        try:
+            value = self.coerce(value)
+        except (TypeError, ValueError):
+            return query.filter(lambda item: False)
+        return query.filter_by(self.field, value)
+
+    def _values(self):
+        with self.storage.lock:
+            values = list(self.storage.hash_indexes[self.field])
+        return sorted(values, key=sort_key)
+
+    def get_choices(self):
+        # the index keys are the distinct values, always up to date
+        return [
+            (value, str(value).capitalize()) for value in self._values()]
+
+    def search_choices(self, term, limit, offset=0):
+        values = (
+            value for value in self._values()
+            if str(value).startswith(term))
+        return [
+            (value, str(value).capitalize())
+            for value in islice(values, offset, offset + limit)]
+
+
+class MemoryController(controller.Controller):
+    """A controller for items kept in a ``MemoryStorage``, for non-SQL
+    data sources.
+
+    ``FieldFilter`` fields get a hash index, and ``orderable`` fields a
+    sorted index, so filtering, ordering and paging do not scan the
+    items. Only offset pagination is supported.
+    """
+    storage = None
+    orderable = ()  # fields with a sorted index
+
+    def __init__(self, *args, storage=None, orderable=None, **kwargs):
+        if storage is not None:
+            self.storage = storage
+        if self.storage is None:
+            self.storage = MemoryStorage()
+        if orderable is not None:
+            self.orderable = orderable
+        super().__init__(*args, **kwargs)
+        if self.keyset_pagination:
+            raise ValueError(
+                'MemoryController only supports offset pagination')
+
+        for filter_ in self.filters.values():
+            filter_.storage = self.storage
+            if isinstance(filter_, FieldFilter):
+                self.storage.add_hash_index(filter_.field)
+        for field in self.orderable:
+            self.storage.add_sorted_index(field)
+
+    # {{{ Helpers
+    def get_query(self):
+        return Query(self.storage)
+
+    def new(self):
+        return Record()
+
+    def _filter(self, query, filters):
+        for filter_, value in self.get_filters(filters):
+            query = filter_.filter(value, query)
+        return query
+    # }}}
+
+    # {{{ Validators Interface
+    def get_item_validator(self, item):
+        return self.get_item_version(item), None
+
+    def get_item_version(self, item):
+        pk = getattr(item, self.storage.pk_field)
+        version = self.storage.versions.get(pk)
+        return '{}-{}'.format(self.storage.token, version)
+
+    def get_list_validator(self, filters=None):
+        # any change in the storage changes every list
+        return '{}-{}'.format(self.storage.token, self.storage.version), None
+    # }}}
+
+    # {{{ Controller Interface
+    def get_items(self, page=1, order_by=None, filters=None, cursor=None):
+        """
+        Select the items matching, ordered by ``order_by``.
+
+        Returns:
+            tuple with:
+                items, sliced by page*self.per_page
+                total items matching the filters
+        """
+        query = self.get_query()
+        if filters is not None:
+            query = self._filter(query, filters)
+        start, stop = 0, None
+        if self.per_page:
+            start = (page-1)*self.per_page
+            stop = start + self.per_page
+        return self.storage.select(query, order_by, start, stop)
+
+    def iter_items(self, order_by=None, filters=None):
+        query = self.get_query()
+        if filters is not None:
+            query = self._filter(query, filters)
+        items, _ = self.storage.select(query, order_by)
+        return iter(items)
+
+    def get_item(self, pk):
+        return self.storage.get(pk)
+
+    def create_item(self, form):
+        item = self.new()
+        form.populate_obj(item)
+        return self.storage.insert(item)
+
+    def create_many(self, forms):
+        items = []
+        for form in forms:
+            item = self.new()
+            form.populate_obj(item)
+            items.append(item)
+        return self.storage.insert_many(items)
+
+    def update_item(self, item, form):
+        changed = self.get_changed_fields(item, form)
+        if not changed:
+            # keep the version, and what is cached with it
+            return item
+        pk = getattr(item, 'id', None)
+        with self.storage.updating(item):
+            self.populate_changed(item, form, changed)
+        if pk is not None:
+            self.invalidate_fragments(pk)
+        return item
+
+    def delete_item(self, item):
+        pk = getattr(item, 'id', None)
+        self.storage.delete(getattr(item, self.storage.pk_field))
+        if pk is not None:
+            self.invalidate_fragments(pk)
+    # }}}
@@ -1,33 +1,63 @@
+from collections import OrderedDict
+from types import MappingProxyType
+import threading
+
 from flask_login import current_user, login_required
-from flask_manager import tree
+from flask_manager import tree, utils
 
 
 class RestrictedControllerMixin:
     decorators = [login_required]
 
+    @utils.request_cached
     def get_roles(self):
         try:
             if current_user.is_superuser():
                 return super().get_roles()
         except AttributeError:
             pass
-        user_roles = current_user.get_roles()
+        user_roles = frozenset(current_user.get_roles())
         roles = super().get_roles()
-        return {
-            key: list(set(values) & set(user_roles))
+        return MappingProxyType({
+            key: tuple(value for value in values if value in user_roles)
             for key, values in roles.items()
-        }
+        })
 
 
 class RestrictedIndex(tree.Index):
     decorators = [login_required]
+    menu_cache_size = 256
+
+    def __init__(self, *args, **kwargs):
+        self._menus = OrderedDict()
+        self._menus_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
 
     def endpoints(self):
         if current_user.is_superuser():
             return super().endpoints()
-        user_roles = current_user.get_roles()
-        endpoints = super().endpoints()
-        return self._filter(endpoints, user_roles)
+        user_roles = frozenset(current_user.get_roles())
+        if self.menu is None:
+            return self._filter(super().endpoints(), user_roles)
+        # the frozen menu only changes in freeze_menu, so the filtered
+        # menus can be cached by the set of roles
+        with self._menus_lock:
+            try:
+                self._menus.move_to_end(user_roles)
+                return self._menus[user_roles]
+            except KeyError:
+                pass
+        menu = self._filter(self.menu, user_roles)
+        with self._menus_lock:
+            self._menus[user_roles] = menu
+            while len(self._menus) > self.menu_cache_size:
+                self._menus.popitem(last=False)
+        return menu
+
+    def freeze_menu(self):
+        with self._menus_lock:
+            self._menus.clear()
+        return super().freeze_menu()
 
     def _filter(self, menu, user_roles):
         try:
@@ -36,4 +66,4 @@ class RestrictedIndex(tree.Index):
             return
         children = [self._filter(child, user_roles) for child in children]
         if endpoint is None or endpoint.strip('.') in user_roles:
-            return name, endpoint, list(filter(None.__ne__, children))
+            return name, endpoint, tuple(filter(None.__ne__, children))
@@ -1,10 +1,27 @@
-from contextlib import contextmanager
+from collections import Counter, OrderedDict
+from concurrent import futures
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar, copy_context
+from decimal import Decimal
+from functools import partial, wraps
 from itertools import chain
+import datetime
+import re
+import threading
+import time
+import weakref
 from cached_property import cached_property
+from flask import current_app, g
 from wtforms_alchemy import ModelForm
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import Executable, ClauseElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy import event, orm
 import sqlalchemy as sa
 
-from flask_manager import controller, display_rules as display_rules_
+from flask_manager import (
+    controller, utils, timing,
+    display_rules as display_rules_)
 
 
 def unique(items):
@@ -16,35 +33,486 @@ def unique(items):
         yield item
 
 
+# {{{ Search backends
+def tokenize(value):
+    """Split a search in words, dropping any punctuation."""
+    return re.findall(r'\w+', value)
+
+
+def get_table(columns):
+    """Return the table of ``columns``, which must share one table."""
+    tables = {column.expression.table for column in columns}
+    if len(tables) != 1:
+        raise ValueError('search index columns must share one table')
+    return tables.pop()
+
+
+def _quote(bind, name):
+    return bind.dialect.identifier_preparer.quote(name)
+
+
+def _create_index(bind, name, table, expression, using):
+    expression = expression.compile(dialect=bind.dialect, compile_kwargs={
+        'literal_binds': True, 'include_table': False})
+    bind.execute(sa.text(
+        'CREATE INDEX IF NOT EXISTS {} ON {} USING {} ({})'.format(
+            _quote(bind, name), _quote(bind, table.name), using, expression)))
+
+
+class LikeSearch:
+    """``LIKE '%value%'`` in any of the columns, no index can serve it,
+    every search is a sequential scan.
+    """
+
+    def filter(self, query, columns, value):
+        clauses = [column.contains(value) for column in columns]
+        return query.filter(sa.or_(*clauses))
+
+    def create_index(self, bind, columns):
+        """Nothing to create."""
+
+
+class SQLiteFTS5:
+    """Match the words in a SQLite FTS5 external content table,
+    named ``<table>_fts``, the table is kept in sync by triggers.
+
+    Args:
+        relevance (bool): order the items by ``rank``, best first.
+        prefix (bool): match words prefix, ``foo`` matches ``foobar``.
+        name (str): the FTS5 table name.
+    """
+
+    def __init__(self, relevance=False, prefix=True, name=None):
+        self.relevance = relevance
+        self.prefix = prefix
+        self.name = name
+
+    def get_name(self, columns):
+        return self.name or '{}_fts'.format(get_table(columns).name)
+
+    def match_query(self, terms):
+        """All the terms, quoted so they are never FTS5 syntax."""
+        suffix = '*' if self.prefix else ''
+        return ' '.join(
+            '"{}"{}'.format(term.replace('"', '""'), suffix)
+            for term in terms)
+
+    def filter(self, query, columns, value):
+        terms = tokenize(value)
+        if not terms:
+            return query
+        name = self.get_name(columns)
+        # the hidden column named as the table matches any column
+        fts = sa.table(
+            name, sa.column('rowid'), sa.column('rank'), sa.column(name))
+        match = fts.c[name].op('MATCH')(self.match_query(terms))
+        rowid, = get_table(columns).primary_key.columns
+        if self.relevance:
+            return query.join(fts, fts.c.rowid == rowid).filter(
+                match).order_by(fts.c.rank)
+        return query.filter(rowid.in_(sa.select([fts.c.rowid]).where(match)))
+
+    def ddl(self, bind, columns):
+        """Return the statements creating the FTS5 table and triggers."""
+        table = get_table(columns)
+        rowid, = table.primary_key.columns
+        name = self.get_name(columns)
+        quoted = [_quote(bind, column.expression.name) for column in columns]
+        names = {
+            'fts': _quote(bind, name),
+            'ai': _quote(bind, name + '_ai'),
+            'ad': _quote(bind, name + '_ad'),
+            'au': _quote(bind, name + '_au'),
+            'table': _quote(bind, table.name),
+            'rowid': _quote(bind, rowid.name),
+            'columns': ', '.join(quoted),
+            'new': ', '.join('new.' + column for column in quoted),
+            'old': ', '.join('old.' + column for column in quoted),
+            # string options take the raw names
+            'content': table.name.replace("'", "''"),
+            'content_rowid': rowid.name.replace("'", "''"),
+        }
+        statements = [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            "{columns}, content='{content}', content_rowid='{content_rowid}')",
+            "CREATE TRIGGER IF NOT EXISTS {ai} AFTER INSERT ON {table} "
+            "BEGIN INSERT INTO {fts}(rowid, {columns}) "
+            "VALUES (new.{rowid}, {new}); END",
+            "CREATE TRIGGER IF NOT EXISTS {ad} AFTER DELETE ON {table} "
+            "BEGIN INSERT INTO {fts}({fts}, rowid, {columns}) "
+            "VALUES ('delete', old.{rowid}, {old}); END",
+            "CREATE TRIGGER IF NOT EXISTS {au} AFTER UPDATE ON {table} "
+            "BEGIN INSERT INTO {fts}({fts}, rowid, {columns}) "
+            "VALUES ('delete', old.{rowid}, {old}); "
+            "INSERT INTO {fts}(rowid, {columns}) "
+            "VALUES (new.{rowid}, {new}); END",
+        ]
+        return [statement.format(**names) for statement in statements]
+
+    def create_index(self, bind, columns):
+        """Create the FTS5 table and its triggers, and index the rows."""
+        for statement in self.ddl(bind, columns):
+            bind.execute(sa.text(statement))
+        self.rebuild(bind, columns)
+
+    def rebuild(self, bind, columns):
+        """Reindex all the rows, for changes made with the triggers off."""
+        name = _quote(bind, self.get_name(columns))
+        bind.execute(sa.text(
+            "INSERT INTO {0}({0}) VALUES ('rebuild')".format(name)))
+
+
+class PostgresFullText:
+    """Match the words against a ``tsvector`` of the columns, served by
+    a GIN expression index, which postgresql keeps up to date.
+
+    Args:
+        config (str): the text search configuration, like ``english``.
+        relevance (bool): order the items by ``ts_rank``, best first.
+        prefix (bool): match words prefix, ``foo`` matches ``foobar``.
+        name (str): the index name.
+    """
+
+    def __init__(self, config='simple', relevance=False, prefix=True,
+                 name=None):
+        if not re.match(r'^\w+$', config):
+            raise ValueError('invalid text search config: {}'.format(config))
+        self.config = config
+        self.relevance = relevance
+        self.prefix = prefix
+        self.name = name
+
+    def get_config(self):
+        # rendered inline, the query must match the index expression
+        return sa.literal_column("'{}'::regconfig".format(self.config))
+
+    def document(self, columns):
+        text = sa.func.coalesce(columns[0], sa.literal_column("''"))
+        for column in columns[1:]:
+            text = text.op('||')(sa.literal_column("' '")).op('||')(
+                sa.func.coalesce(column, sa.literal_column("''")))
+        return sa.func.to_tsvector(self.get_config(), text)
+
+    def filter(self, query, columns, value):
+        terms = tokenize(value)
+        if not terms:
+            return query
+        suffix = ':*' if self.prefix else ''
+        tsquery = sa.func.to_tsquery(
+            self.get_config(), ' & '.join(term + suffix for term in terms))
+        document = self.document(columns)
+        query = query.filter(document.op('@@')(tsquery))
+        if self.relevance:
+            query = query.order_by(sa.func.ts_rank(document, tsquery).desc())
+        return query
+
+    def create_index(self, bind, columns):
+        table = get_table(columns)
+        name = self.name or 'ix_{}_tsvector'.format(table.name)
+        _create_index(bind, name, table, self.document(
+            [column.expression for column in columns]), 'gin')
+
+
+class PostgresTrigram:
+    """``ILIKE '%word%'`` for every word, in any of the columns, served
+    by ``pg_trgm`` GIN indexes, one per column.
+
+    Args:
+        relevance (bool): order the items by ``similarity``, best first.
+    """
+
+    def __init__(self, relevance=False):
+        self.relevance = relevance
+
+    def filter(self, query, columns, value):
+        terms = tokenize(value)
+        if not terms:
+            return query
+        for term in terms:
+            pattern = '%{}%'.format(
+                term.replace('\\', '\\\\').replace('_', '\\_'))
+            query = query.filter(sa.or_(*[
+                column.ilike(pattern, escape='\\') for column in columns]))
+        if self.relevance:
+            similarity = [sa.func.similarity(column, value)
+                          for column in columns]
+            if len(similarity) > 1:
+                similarity = [sa.func.greatest(*similarity)]
+            query = query.order_by(similarity[0].desc())
+        return query
+
+    def create_index(self, bind, columns):
+        bind.execute(sa.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for column in columns:
+            column = column.expression
+            name = 'ix_{}_{}_trgm'.format(column.table.name, column.name)
+            expression = sa.literal_column(
+                '{} gin_trgm_ops'.format(_quote(bind, column.name)))
+            _create_index(bind, name, column.table, expression, 'gin')
+# }}}
+
+
 class SearchFilter(controller.SearchFilter):
-    def __init__(self, columns, join_tables=None):
+    """Search ``columns`` with ``backend``.
+
+    Args:
+        columns (list): the model columns searched.
+        join_tables (list): tables joined for the columns.
+        backend: one of ``LikeSearch`` ( default ), ``SQLiteFTS5``,
+            ``PostgresFullText`` or ``PostgresTrigram``.
+    """
+
+    def __init__(self, columns, join_tables=None, backend=None):
         self.columns = columns
         self.join_tables = join_tables
+        self.backend = backend if backend is not None else LikeSearch()
 
     def filter(self, value, query):
-        clauses = [column.contains(value) for column in self.columns]
-        return query.filter(sa.or_(*clauses))
+        return self.backend.filter(query, self.columns, value)
+
+    def create_index(self, bind):
+        """Create the index of the backend, for ``bind`` engine."""
+        self.backend.create_index(bind, self.columns)
 
 
 class FieldFilter(controller.FieldFilter):
-    def __init__(self, column, join_tables=None):
+    """Filter by ``column`` value.
+
+    Args:
+        column: the column to filter.
+        join_tables (Optional[list]): tables to join with the query.
+        ttl (Optional[int]): seconds to cache the choices, the cache is
+            also invalidated when the controller changes the column,
+            None to cache until invalidated.
+        remote (bool): fetch the choices on demand, by prefix,
+            for columns with too many distinct values.
+    """
+
+    def __init__(self, column, join_tables=None, ttl=300, remote=False):
         # I know its evil, and bad, but will inject session in
         # SQLAlchemyController.__ini__
         self.db_session = None
         self.column = column
         self.join_tables = join_tables
+        self.ttl = ttl
+        self.remote = remote
+        self._choices = None
 
     def filter(self, value, query):
         return query.filter(self.column == value)
 
-    def get_choices(self):
-        values = self.db_session.query(self.column).distinct()
+    def get_choices(self, session=None):
+        now = time.monotonic()
+        cached = self._choices
+        if cached is not None and (cached[0] is None or cached[0] > now):
+            return cached[1]
+        if session is None:
+            session = self.db_session
+        if session is None:
+            # no session to query outside ``run_sync``, the choices are
+            # the ones loaded last, by ``load_choices``
+            return [] if cached is None else cached[1]
+        choices = list(self._get_choices(session))
+        expires = None if self.ttl is None else now + self.ttl
+        self._choices = expires, choices
+        return choices
+
+    def search_choices(self, term, limit, offset=0, session=None):
+        if session is None:
+            session = self.db_session
+        values = session.query(self.column).distinct()
+        if term:
+            column = self.column
+            if not isinstance(column.type, sa.String):
+                column = sa.cast(column, sa.String)
+            # a prefix LIKE can use the column index
+            values = values.filter(column.startswith(term, autoescape=True))
+        values = values.order_by(self.column).offset(offset).limit(limit)
+        return list(self._as_choices(values))
+
+    def _get_choices(self, session):
+        values = session.query(self.column).distinct()
+        return self._as_choices(values)
+
+    @staticmethod
+    def _as_choices(values):
         for value in chain.from_iterable(values):
             title = str(value).capitalize()
             if isinstance(value, bool):
                 value = str(int(value))
             yield value, title
 
+    def invalidate(self):
+        # expired, but kept for filters without a session of their own
+        if self._choices is not None:
+            self._choices = 0, self._choices[1]
+
+    def is_changed_by(self, model_class, keys):
+        """Check if changing ``keys`` of ``model_class`` (None for all
+        the keys) may change the choices.
+        """
+        if getattr(self.column, 'class_', model_class) is not model_class:
+            return False
+        return keys is None or getattr(self.column, 'key', None) in keys
+
+
+# {{{ Count strategies
+class Explain(Executable, ClauseElement):
+    """EXPLAIN a statement, only postgresql is supported."""
+
+    # cached by the explained statement, like any other construct
+    inherit_cache = True
+    _traverse_internals = [('statement', InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _explain_postgresql(element, compiler, **kwargs):
+    return 'EXPLAIN (FORMAT JSON) {}'.format(
+        compiler.process(element.statement, **kwargs))
+
+
+class ExactCount:
+    """Count the items with a ``COUNT(*)`` on every request."""
+
+    def __call__(self, crud, query, filters):
+        """
+        Args:
+            crud (SQLAlchemyController): the controller counting.
+            query (Query): the filtered query.
+            filters (tuple): ``crud.normalize_filters`` of the filters.
+
+        Returns:
+            int: the total of items.
+        """
+        # sqlalchemy query.count() uses a generic subquery count, which
+        # is slow, this one only replace the selected columns with a
+        # COUNT(*)
+        stmt = query.order_by(None).statement.with_only_columns(
+            [sa.func.count()]).select_from(crud.model_class)
+        return query.session.execute(stmt).scalar()
+
+    def invalidate(self, crud):
+        """Called when ``crud`` add, change or remove items."""
+
+
+class CachedCount(ExactCount):
+    """Cache the exact count for ``ttl`` seconds, keyed by the filters.
+
+    Args:
+        ttl (int): seconds to keep a total.
+        max_size (int): max number of totals kept, older are evicted.
+    """
+
+    def __init__(self, ttl=60, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, crud, query, filters):
+        key = (crud.absolute_name, filters)
+        now = time.monotonic()
+        with self._lock:
+            expires, total = self._cache.get(key, (0, None))
+            if expires > now:
+                self._cache.move_to_end(key)
+                return total
+        total = super().__call__(crud, query, filters)
+        with self._lock:
+            self._cache[key] = now + self.ttl, total
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return total
+
+    def invalidate(self, crud):
+        with self._lock:
+            for key in [key for key in self._cache
+                        if key[0] == crud.absolute_name]:
+                del self._cache[key]
+
+
+class EstimatedCount(ExactCount):
+    """Ask the database planner for the total, instead of counting.
+
+    Postgresql uses ``pg_class.reltuples`` without filters and
+    the ``EXPLAIN`` rows with filters, sqlite uses ``sqlite_stat1``
+    ( needs ``ANALYZE`` ) without filters, anything else is counted.
+
+    Args:
+        threshold (int): estimates below it are counted exactly,
+            counting is cheap and estimates are rough for small tables.
+    """
+
+    def __init__(self, threshold=100000):
+        self.threshold = threshold
+
+    def __call__(self, crud, query, filters):
+        estimate = self.estimate(crud, query, filters)
+        if estimate is None or estimate < self.threshold:
+            return super().__call__(crud, query, filters)
+        return controller.EstimatedTotal(estimate)
+
+    def estimate(self, crud, query, filters):
+        """Return the planner estimate, or None if not available."""
+        session = query.session
+        table = sa.inspect(crud.model_class).local_table
+        dialect = session.connection().dialect.name
+        if dialect == 'postgresql' and not filters:
+            stmt = sa.text(
+                'SELECT reltuples FROM pg_class '
+                'WHERE oid = CAST(:name AS regclass)')
+            estimate = session.execute(stmt, {'name': table.fullname}).scalar()
+            # never analyzed tables have reltuples = -1
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        elif dialect == 'postgresql':
+            stmt = Explain(query.order_by(None).statement)
+            plan = session.execute(stmt).scalar()
+            return int(plan[0]['Plan']['Plan Rows'])
+        elif dialect == 'sqlite' and not filters:
+            stmt = sa.text(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = :name')
+            try:
+                stat = session.execute(stmt, {'name': table.name}).scalar()
+            except sa.exc.OperationalError:  # never analyzed
+                return None
+            if stat is not None:
+                return int(stat.split()[0])
+        return None
+
+
+def _is_private_sqlite(engine):
+    """If ``engine`` is a sqlite in memory database, whose tables are
+    seen only by the connection which created them.
+    """
+    url = engine.url
+    if engine.dialect.name != 'sqlite':
+        return False
+    if url.database in (None, '', ':memory:'):
+        return True
+    query = dict(url.query)
+    return query.get('mode') == 'memory' and query.get('cache') != 'shared'
+
+
+_count_executor = None
+_count_executor_lock = threading.Lock()
+
+
+def get_count_executor(max_workers=4):
+    """Return the thread pool shared by the concurrent counts."""
+    global _count_executor  # pylint: disable=global-statement
+    with _count_executor_lock:
+        if _count_executor is None:
+            _count_executor = futures.ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='flask-manager-count')
+        return _count_executor
+# }}}
+
 
 @contextmanager
 def transaction(db_session):
@@ -56,10 +524,246 @@ def transaction(db_session):
         raise
 
 
+def get_changed_keys(item):
+    """Return the keys of the changed attributes of ``item``,
+    None if it is a new item ( all changed ).
+    """
+    state = sa.inspect(item)
+    if state.transient or state.pending:
+        return None
+    return {attr.key for attr in state.attrs if attr.history.has_changes()}
+
+
 def get_model_name(model_class):
     return sa.inspect(model_class).entity.__name__
 
 
+def dump_value(value):
+    """Convert a column value to something json can serialize."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def load_value(column, value):
+    """Revert ``dump_value`` using ``column`` type.
+
+    Raises:
+        ValueError: ``value`` is not a scalar of the column type.
+    """
+    if value is None:
+        return value
+    if not isinstance(value, (str, int, float)):
+        raise ValueError('not a scalar: {!r}'.format(value))
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is bool:
+        if not isinstance(value, bool):
+            raise ValueError('not a bool: {!r}'.format(value))
+        return value
+    if isinstance(value, bool):
+        raise ValueError('not a {}: {!r}'.format(python_type.__name__, value))
+    if python_type in (datetime.datetime, datetime.date, datetime.time):
+        if not isinstance(value, str):
+            raise ValueError('not a date: {!r}'.format(value))
+        return python_type.fromisoformat(value)
+    if python_type is Decimal:
+        return Decimal(value)
+    if python_type is int:
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if not isinstance(value, int):
+            raise ValueError('not a int: {!r}'.format(value))
+    elif python_type is float:
+        if isinstance(value, str):
+            raise ValueError('not a float: {!r}'.format(value))
+        return float(value)
+    elif python_type is str:
+        if not isinstance(value, str):
+            raise ValueError('not a str: {!r}'.format(value))
+    return value
+
+
+def _is_int(value):
+    try:
+        int(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _is_nullable(column):
+    """If ``column``, a column attribute, may hold NULL."""
+    return getattr(column.expression, 'nullable', True)
+
+
+def get_loader_option(model_class, path):
+    """Build a eager loader option for a relationship ``path``.
+
+    Collections use ``selectinload``, scalars use ``joinedload``.
+
+    Args:
+        model_class: the model where ``path`` starts.
+        path (str): a dotted path of relationships, like ``a.b``.
+
+    Returns:
+        the loader option, None if ``path`` has no relationship.
+    """
+    option = None
+    for name in path.split('.'):
+        prop = sa.inspect(model_class).relationships.get(name)
+        if prop is None:
+            break
+        attribute = getattr(model_class, name)
+        loader = 'selectinload' if prop.uselist else 'joinedload'
+        if option is None:
+            option = getattr(orm, loader)(attribute)
+        else:
+            option = getattr(option, loader)(attribute)
+        model_class = prop.mapper.class_
+    return option
+
+
+def chunked(items, size):
+    """Split ``items`` in lists of at most ``size`` items."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start+size]
+
+
+# {{{ Bulk actions
+def batched(func):
+    """Action decorator, call ``func(crud, items)`` for each batch
+    of selected items, committing once per batch.
+
+    Example:
+        actions = ActionSet()
+
+        @actions.register('publish')
+        @batched
+        def publish(crud, items):
+            for item in items:
+                item.published = True
+    """
+    @wraps(func)
+    def action(crud, ids):
+        return crud.run_batched(ids, func)
+    return action
+
+
+def bulk_delete(crud, ids):
+    """Action deleting the selected items with ``DELETE ... WHERE pk IN``."""
+    return crud.delete_many(ids)
+
+
+def bulk_update(**values):
+    """Action factory, set ``values`` in the selected items with
+    ``UPDATE ... WHERE pk IN``.
+
+    Example:
+        actions = {'disable': bulk_update(enabled=False)}
+    """
+    def action(crud, ids):
+        return crud.update_many(ids, values)
+    return action
+# }}}
+
+
+# {{{ Query accounting
+class QueryBudgetExceeded(Exception):
+    """A request ran more statements than its controller budget."""
+
+
+class QueryStats:
+    """The statements run by a request.
+
+    Attributes:
+        count (int): number of statements.
+        duration (float): seconds spent running them.
+        statements (Counter): runs of each statement, by its sql, with
+            placeholders for the parameters, a lazy load per row is a
+            statement run once per row.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def most_repeated(self):
+        """Return ``(sql, runs)`` of the most repeated statement."""
+        for sql, runs in self.statements.most_common(1):
+            return sql, runs
+        return None, 0
+
+
+_query_stats = ContextVar('flask_manager_query_stats', default=None)
+_tracked_engines = weakref.WeakSet()
+_tracked_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, *args):
+    if _query_stats.get() is not None:
+        conn.info.setdefault('_flask_manager_started', []).append(
+            time.perf_counter())
+
+
+def _pop_started(conn):
+    # None if the statement started before the tracking did
+    started = conn.info.get('_flask_manager_started')
+    return started.pop() if started else None
+
+
+def _after_cursor_execute(conn, cursor, statement, *args):
+    stats = _query_stats.get()
+    if stats is None:
+        return
+    started = _pop_started(conn)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.count += 1
+    stats.duration += elapsed
+    stats.statements[statement] += 1
+    timings = timing.get_timings()
+    if timings is not None:
+        timings['sql'] = timings.get('sql', 0) + elapsed
+
+
+def _handle_error(context):
+    # a failed statement has no after_cursor_execute
+    if context.connection is not None:
+        _pop_started(context.connection)
+
+
+def track_engine(engine):
+    """Listen to the statements of ``engine``, once."""
+    with _tracked_lock:
+        if engine in _tracked_engines:
+            return
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+        _tracked_engines.add(engine)
+
+
+def get_query_stats():
+    """The ``QueryStats`` of the current request, None if its
+    controller does not count its queries.
+
+    Example:
+        with app.test_client() as client:
+            client.get('/model/')
+            assert get_query_stats().count <= 3
+    """
+    return g.get('_flask_manager_query_stats')
+# }}}
+
+
 def get_columns(model_class):
     columns = sa.inspect(model_class).columns
     return [
@@ -72,19 +776,51 @@ class SQLAlchemyController(controller.Controller):
     extra_display_rules = {}
     db_session = None
     model_class = None
+    count_strategy = ExactCount()
+    list_projection = False
+    # count in a thread pool, with a session of its own, while the page
+    # is fetched, a count slower than ``count_timeout`` seconds is
+    # dropped, the total is unknown, and canceled by postgresql, mysql
+    # and sqlite, other databases keep a worker until it ends, give them
+    # a ``count_executor`` of their own
+    concurrent_count = False
+    count_timeout = None
+    count_executor = None  # a futures.Executor, None for a shared one
+    # attribute changed on every update, a version counter or a
+    # ``updated_at`` datetime, enables conditional GETs, the writes set
+    # it unless the column ``onupdate`` or mapper ``version_id_col`` does
+    version_column = None
+    bulk_chunk_size = 500
+    export_batch_size = 1000
+    # {role name: iterable of relationship paths or loader options},
+    # roles not in it are planned from the display rules
+    eager_load = {}
+    # count the statements of each request, in ``get_query_stats``,
+    # statements of a concurrent count are not counted
+    query_accounting = False
+    # budget of a List request, the max number of statements, the max
+    # runs of a same statement, and ``'log'`` or ``'raise'`` when over
+    max_queries = None
+    max_repeated_queries = None
+    query_budget_action = 'log'
 
-    def __init__(self, *args, db_session=None, model_class=None, **kwargs):
+    def __init__(self, *args, db_session=None, model_class=None,
+                 count_strategy=None, **kwargs):
         if db_session is not None:
             self.db_session = db_session
         if model_class is not None:
             self.model_class = model_class
+        if count_strategy is not None:
+            self.count_strategy = count_strategy
+        self._load_options = {}
 
         if self.name is None:
             self.name = get_model_name(self.model_class)
 
+        super().__init__(*args, **kwargs)
+        # after the ``filters`` kwarg is set
         for filter_ in self.filters.values():
             filter_.db_session = self.db_session
-        super().__init__(*args, **kwargs)
 
     # {{{ Generated from model_class
     @cached_property
@@ -120,31 +856,308 @@ class SQLAlchemyController(controller.Controller):
     def get_query(self):
         return self.db_session.query(self.model_class)
 
+    def get_engine(self):
+        return self.get_query().session.get_bind(
+            sa.inspect(self.model_class))
+
+    def get_load_options(self, *roles):
+        """Return the eager loader options for ``roles`` display rules.
+
+        So the relationships read by the rules are loaded with a fixed
+        number of queries, instead of one lazy load per item.
+        """
+        try:
+            return self._load_options[roles]
+        except KeyError:
+            pass
+        paths = []
+        for role in roles:
+            if role in self.eager_load:
+                paths.extend(self.eager_load[role])
+            else:
+                paths.extend(display_rules_.iter_field_names(
+                    self.display_rules.get(role)))
+        options = []
+        for path in unique(paths):
+            if isinstance(path, str):
+                path = get_loader_option(self.model_class, path)
+            if path is not None:
+                options.append(path)
+        self._load_options[roles] = options
+        return options
+
     def new(self):
         # pylint: disable=not-callable
         return self.model_class()
 
+    def _populate_many(self, forms):
+        items = []
+        for form in forms:
+            item = self.new()
+            form.populate_obj(item)
+            items.append(item)
+        return items
+
     def save(self, item):
+        keys = get_changed_keys(item)
+        pk = getattr(item, 'id', None)  # read before commit expires it
         with transaction(self.db_session) as session:
             session.add(item)
+            self._bump_version(session, [item])
+        self.on_change(keys)
+        if pk is not None:
+            self.invalidate_fragments(pk)
         return item
 
     def delete(self, item):
+        pk = getattr(item, 'id', None)
         with transaction(self.db_session) as session:
             session.delete(item)
+        self.on_change()
+        if pk is not None:
+            self.invalidate_fragments(pk)
 
-    def count(self, query):
-        # sqlalchemy query.count() uses a generic subquery count, which
-        # is slow, this one only replace the selected columns with a
-        # COUNT(*)
-        stmt = query.statement.with_only_columns([sa.func.count()])
-        return self.db_session.execute(stmt).scalar()
+    def on_change(self, keys=None):
+        """Called after items are written, to invalidate caches.
+
+        Args:
+            keys (Optional[set]): the changed attributes, None for all.
+        """
+        self.count_strategy.invalidate(self)
+        for filter_ in self.filters.values():
+            is_changed_by = getattr(filter_, 'is_changed_by', None)
+            if is_changed_by is not None and \
+                    is_changed_by(self.model_class, keys):
+                filter_.invalidate()
+
+    def count(self, query, filters=None):
+        normalized = self.normalize_filters(filters or {})
+        with timing.phase('count'):
+            return self.count_strategy(self, query, normalized)
+
+    def count_later(self, query, filters=None):
+        """Start counting, return a function waiting for the total.
+
+        Returns:
+            callable: returns the total, None if the count was slower
+                than ``count_timeout``, or canceled by the database.
+        """
+        if not self.concurrent_count:
+            return partial(self.count, query, filters)
+        engine = query.session.get_bind(sa.inspect(self.model_class))
+        if _is_private_sqlite(engine):
+            # the other threads would count in a empty database
+            return partial(self.count, query, filters)
+        normalized = self.normalize_filters(filters or {})
+        executor = self.count_executor or get_count_executor()
+        future = executor.submit(
+            copy_context().run, self._count_apart, engine, query, normalized)
+        started = time.monotonic()
+
+        def wait():
+            timeout = self.count_timeout
+            if timeout is not None:
+                timeout = max(0, started + timeout - time.monotonic())
+            try:
+                with timing.phase('count'):
+                    return future.result(timeout=timeout)
+            except futures.TimeoutError:
+                # not started yet, do not hold a worker for nothing
+                future.cancel()
+                return None
+            except sa.exc.OperationalError:
+                return None
+        return wait
+
+    def _count_apart(self, engine, query, filters):
+        # statements of a concurrent count are not counted
+        _query_stats.set(None)
+        session = orm.Session(bind=engine)
+        try:
+            with self._statement_timeout(session, engine.dialect):
+                return self.count_strategy(
+                    self, query.with_session(session), filters)
+        finally:
+            session.close()
+
+    @contextmanager
+    def _statement_timeout(self, session, dialect):
+        """Cancel the statements run inside in the database too, not
+        just drop their result, after ``self.count_timeout`` seconds,
+        so a slow count does not hold a worker of the pool.
+        """
+        timeout = self.count_timeout
+        if timeout is None:
+            yield
+        elif dialect.name == 'postgresql':
+            session.execute(sa.text(
+                'SET LOCAL statement_timeout = {:d}'.format(
+                    int(timeout * 1000))))
+            yield
+        elif dialect.name == 'mysql':
+            if getattr(dialect, 'is_mariadb', False):
+                variable, value = 'max_statement_time', '{:f}'.format(timeout)
+            else:
+                variable, value = 'max_execution_time', '{:d}'.format(
+                    int(timeout * 1000))
+            session.execute(sa.text(
+                'SET SESSION {} = {}'.format(variable, value)))
+            try:
+                yield
+            finally:
+                session.execute(sa.text(
+                    'SET SESSION {} = DEFAULT'.format(variable)))
+        elif dialect.name == 'sqlite':
+            connection = session.connection().connection.dbapi_connection
+            deadline = time.monotonic() + timeout
+            # a true return interrupts the statement, with a
+            # OperationalError
+            connection.set_progress_handler(
+                lambda: time.monotonic() > deadline, 1000)
+            try:
+                yield
+            finally:
+                connection.set_progress_handler(None, 1000)
+        else:
+            yield
 
     def _get_field(self, name):
         if name[0] == '-':
-            return -getattr(self.model_class, name[1:])
+            return getattr(self.model_class, name[1:]).desc()
         return getattr(self.model_class, name)
 
+    def _keyset_columns(self, order_by):
+        # (attribute name, column, descending), the primary key is always
+        # appended as tiebreaker, so the ordering is deterministic
+        keys = []
+        descending = False
+        if order_by is not None:
+            descending = order_by[0] == '-'
+            name = order_by.lstrip('-')
+            keys.append((name, getattr(self.model_class, name), descending))
+        mapper = sa.inspect(self.model_class)
+        for column in mapper.primary_key:
+            name = mapper.get_property_by_column(column).key
+            if name not in [key for key, _, _ in keys]:
+                attribute = getattr(self.model_class, name)
+                keys.append((name, attribute, descending))
+        return keys
+
+    @staticmethod
+    def _keyset_clause(keys, values, backwards):
+        # (a, b) > (x, y) => a > x OR (a = x AND b > y), NULL sorts after
+        # any value, the same as in ``_keyset_order``
+        clauses = []
+        equals = []
+        for (_, column, descending), value in zip(keys, values):
+            if descending == backwards:
+                after = sa.false() if value is None else \
+                    column > value
+                if _is_nullable(column) and value is not None:
+                    after = sa.or_(after, column.is_(None))
+            else:
+                after = column.isnot(None) if value is None else \
+                    column < value
+            clauses.append(sa.and_(*equals, after))
+            equals.append(
+                column.is_(None) if value is None else column == value)
+        return sa.or_(*clauses)
+
+    @staticmethod
+    def _keyset_order(keys, backwards):
+        # NULL sorts last ascending and first descending on any dialect
+        order_by = []
+        for _, column, descending in keys:
+            descending = descending != backwards
+            if _is_nullable(column):
+                is_null = column.is_(None)
+                order_by.append(is_null.desc() if descending else is_null)
+            order_by.append(column.desc() if descending else column.asc())
+        return order_by
+
+    def _dump_cursor(self, keys, item, direction):
+        values = [dump_value(getattr(item, name)) for name, _, _ in keys]
+        return utils.encode_cursor([direction, values])
+
+    def _load_cursor(self, keys, cursor):
+        try:
+            direction, values = utils.decode_cursor(cursor)
+        except TypeError as e:
+            raise ValueError('invalid cursor') from e
+        if direction not in ('next', 'prev') or \
+                not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError('invalid cursor')
+        try:
+            values = [
+                load_value(column, value)
+                for (_, column, _), value in zip(keys, values)
+            ]
+        except (ArithmeticError, TypeError, ValueError) as e:
+            # decimal.InvalidOperation is an ArithmeticError
+            raise ValueError('invalid cursor') from e
+        return direction == 'prev', values
+
+    def _projected_columns(self, extra_names=()):
+        """Return the list columns, primary key and ``extra_names``
+        attributes, None if the list display rule is not a ``ColumnSet``
+        of column attributes.
+        """
+        names = getattr(self.display_rules.get('list'), 'columns', None)
+        if names is None:
+            return None
+        mapper = sa.inspect(self.model_class)
+        pk_names = [
+            mapper.get_property_by_column(column).key
+            for column in mapper.primary_key
+        ]
+        names = list(unique([*pk_names, *names, *extra_names]))
+        if not all(name in mapper.column_attrs for name in names):
+            return None
+        return [getattr(self.model_class, name) for name in names]
+
+    def _project(self, query, extra_names=(), options=()):
+        """Select only the list columns, primary key, ``extra_names``
+        and ``version_column``, read by the validators and fragments.
+
+        Rows are lightweight named tuples instead of entities, skipping
+        the unused columns and the identity map bookkeeping.
+        Unless ``self.list_projection`` is set, and the list display rule
+        has only column attributes, entities are loaded with ``options``.
+        """
+        if self.list_projection:
+            if self.version_column is not None:
+                extra_names = [*extra_names, self.version_column]
+            columns = self._projected_columns(extra_names)
+            if columns is not None:
+                return query.with_entities(*columns)
+        return query.options(*options)
+
+    def _get_keyset_page(self, query, order_by, cursor, options=()):
+        keys = self._keyset_columns(order_by)
+        query = self._project(query, [name for name, _, _ in keys], options)
+        backwards = False
+        if cursor is not None:
+            backwards, values = self._load_cursor(keys, cursor)
+            query = query.filter(self._keyset_clause(keys, values, backwards))
+        # pages are walked by the keys only, drop any order from filters
+        query = query.order_by(None).order_by(
+            *self._keyset_order(keys, backwards))
+        # fetch one extra row to know if there is more rows ahead
+        items = query.limit(self.per_page + 1).all()
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, cursor is not None
+        page = controller.KeysetPage(items)
+        if items and has_next:
+            page.next_cursor = self._dump_cursor(keys, items[-1], 'next')
+        if items and has_prev:
+            page.prev_cursor = self._dump_cursor(keys, items[0], 'prev')
+        return page
+
     def _filter(self, query, filters):
         join_tables = []
         for filter_, value in self.get_filters(filters):
@@ -156,8 +1169,211 @@ class SQLAlchemyController(controller.Controller):
         return query
     # }}}
 
+    # {{{ Query accounting
+    def track_queries(self, budget=False):
+        if not self.query_accounting:
+            return nullcontext()
+        return self._track_queries(budget)
+
+    @contextmanager
+    def _track_queries(self, budget):
+        track_engine(self.get_engine())
+        stats = g._flask_manager_query_stats = QueryStats()
+        token = _query_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            _query_stats.reset(token)
+        if budget:
+            self.check_query_budget(stats)
+
+    def check_query_budget(self, stats):
+        """Log, or raise ``QueryBudgetExceeded``, if ``stats`` is over
+        ``max_queries`` or ``max_repeated_queries``.
+        """
+        problems = []
+        if self.max_queries is not None and stats.count > self.max_queries:
+            problems.append('{} statements, budget {}'.format(
+                stats.count, self.max_queries))
+        sql, runs = stats.most_repeated()
+        if self.max_repeated_queries is not None and \
+                runs > self.max_repeated_queries:
+            problems.append('a statement run {} times, budget {}: {}'.format(
+                runs, self.max_repeated_queries, sql))
+        if not problems:
+            return
+        message = '{} over its query budget, {}'.format(
+            self.name, '; '.join(problems))
+        if self.query_budget_action == 'raise':
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    # }}}
+
+    # {{{ Validators Interface
+    def get_item_validator(self, item):
+        if self.version_column is None:
+            return None, None
+        version = getattr(item, self.version_column)
+        if isinstance(version, datetime.datetime):
+            return version.isoformat(), version
+        return str(version), None
+
+    def get_item_version(self, item):
+        etag, _ = self.get_item_validator(item)
+        return etag
+
+    def get_list_validator(self, filters=None):
+        """A fingerprint of the matching rows: their count, max pk and
+        the max of ``version_column`` datetimes, or sum of counters, so
+        any insert, update or delete changes it.
+
+        Rows of other tables, shown by relationships, are not included.
+        """
+        if self.version_column is None:
+            return None, None
+        query = self.get_query()
+        if filters is not None:
+            query = self._filter(query, filters)
+        return self._list_validator(query)
+
+    def _list_validator(self, query):
+        version = getattr(self.model_class, self.version_column)
+        is_datetime = isinstance(version.type, sa.DateTime)
+        aggregate = sa.func.max if is_datetime else sa.func.sum
+        columns = [sa.func.count(), aggregate(version)]
+        primary_key = sa.inspect(self.model_class).primary_key
+        if len(primary_key) == 1:
+            columns.append(sa.func.max(primary_key[0]))
+        stmt = query.order_by(None).statement.with_only_columns(
+            columns).select_from(self.model_class)
+        row = query.session.execute(stmt).one()
+        etag = '-'.join(str(value) for value in row)
+        return etag, row[1] if is_datetime else None
+    # }}}
+
+    # {{{ Bulk Interface
+    def _pk_column(self):
+        primary_key = sa.inspect(self.model_class).primary_key
+        if len(primary_key) != 1:
+            raise ValueError('bulk operations need a single column pk')
+        return primary_key[0]
+
+    def _pk_chunks(self, ids):
+        column = self._pk_column()
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if python_type is int:
+            # a id that is not a number matches no row, skip it
+            ids = [int(pk) for pk in ids if _is_int(pk)]
+        return column, chunked(unique(ids), self.bulk_chunk_size)
+
+    def get_many(self, ids):
+        """Load items by pk, in chunked ``IN (...)`` queries.
+
+        Args:
+            ids (iterable): primary keys of the items.
+
+        Yields:
+            list: a batch of at most ``self.bulk_chunk_size`` items.
+        """
+        column, chunks = self._pk_chunks(ids)
+        for chunk in chunks:
+            yield self.get_query().filter(column.in_(chunk)).all()
+
+    def run_batched(self, ids, func):
+        """Call ``func(self, items)`` for each batch of ``get_many(ids)``,
+        committing once per batch, changing ``version_column`` of the
+        changed items too.
+        """
+        for items in self.get_many(ids):
+            with transaction(self.db_session) as session:
+                func(self, items)
+                self._bump_version(session, items)
+        self.on_change()
+        self.invalidate_fragments()
+
+    def _new_version(self):
+        """A new ``version_column`` value, None when there is no version
+        column or its ``onupdate`` sets it.
+        """
+        if self.version_column is None:
+            return None
+        version = getattr(self.model_class, self.version_column)
+        column = version.expression
+        if getattr(column, 'onupdate', None) is not None:
+            return None
+        if isinstance(column.type, sa.DateTime):
+            if column.type.timezone:
+                return datetime.datetime.now(datetime.timezone.utc)
+            return datetime.datetime.utcnow()
+        return version + 1
+
+    def _versioned(self, values):
+        """``values`` with a new ``version_column``, unless set in it or
+        by the column ``onupdate``, so the validators and the fragments
+        of other processes see the change.
+        """
+        keys = {getattr(key, 'key', key) for key in values}
+        if self.version_column in keys:
+            return values
+        value = self._new_version()
+        if value is None:
+            return values
+        return {**values, self.version_column: value}
+
+    def _bump_version(self, session, items):
+        """Set a new ``version_column`` on the changed ``items``, like
+        ``_versioned``, unless set by them or the mapper
+        ``version_id_col``, call it before the commit.
+        """
+        if self.version_column is None:
+            return
+        mapper = sa.inspect(self.model_class)
+        column = getattr(self.model_class, self.version_column).expression
+        if mapper.version_id_col is column:
+            return
+        value = None
+        for item in items:
+            if item in session.deleted:
+                continue
+            keys = get_changed_keys(item)
+            if not keys or self.version_column in keys:
+                continue
+            if value is None:
+                value = self._new_version()
+                if value is None:
+                    return
+            setattr(item, self.version_column, value)
+
+    def update_many(self, ids, values):
+        """Set ``values`` with a ``UPDATE ... WHERE pk IN`` per chunk,
+        in a single transaction, changing ``version_column`` too.
+        """
+        values = self._versioned(values)
+        column, chunks = self._pk_chunks(ids)
+        with transaction(self.db_session) as session:
+            for chunk in chunks:
+                session.query(self.model_class).filter(
+                    column.in_(chunk)).update(
+                        values, synchronize_session=False)
+        self.on_change({getattr(key, 'key', key) for key in values})
+        self.invalidate_fragments()
+
+    def delete_many(self, ids):
+        """``DELETE ... WHERE pk IN`` per chunk, in a single transaction."""
+        column, chunks = self._pk_chunks(ids)
+        with transaction(self.db_session) as session:
+            for chunk in chunks:
+                session.query(self.model_class).filter(
+                    column.in_(chunk)).delete(synchronize_session=False)
+        self.on_change()
+        self.invalidate_fragments()
+    # }}}
+
     # {{{ Controller Interface
-    def get_items(self, page=1, order_by=None, filters=None):
+    def get_items(self, page=1, order_by=None, filters=None, cursor=None):
         """
         Fetch database for items matching.
 
@@ -169,29 +1385,88 @@ class SQLAlchemyController(controller.Controller):
                 a field name to order query by.
             filters (dict):
                 a ``filter name``: ``value`` dict.
+            cursor (str):
+                a cursor from a previous ``KeysetPage``,
+                only used if ``self.keyset_pagination``.
 
         Returns:
             tuple with:
                 items, sliced by page*self.per_page
-                total items without slice
+                total items without slice, None if unknown
+
+        Raises:
+            ValueError: if ``cursor`` is invalid.
         """
+        options = self.get_load_options('list')
+        if self.keyset_pagination:
+            query = self.get_query()
+            if filters is not None:
+                query = self._filter(query, filters)
+            total = self.count_later(query, filters)
+            page = self._get_keyset_page(query, order_by, cursor, options)
+            return page, total()
         start = (page-1)*self.per_page
         query = self.get_query()
         if order_by is not None:
             query = query.order_by(self._get_field(order_by))
         if filters is not None:
             query = self._filter(query, filters)
-        return query.offset(start).limit(self.per_page), self.count(query)
+        total = self.count_later(query, filters)
+        items = self._project(query, options=options)
+        items = items.offset(start).limit(self.per_page)
+        if self.concurrent_count:
+            items = items.all()
+        return items, total()
+
+    def iter_items(self, order_by=None, filters=None):
+        """
+        Stream all items matching, with a server side cursor.
+
+        Only the list columns are selected when possible, and rows are
+        fetched ``self.export_batch_size`` at time, so memory is
+        constant no matter how many items match.
+        """
+        query = self.get_query()
+        if order_by is not None:
+            query = query.order_by(self._get_field(order_by))
+        if filters is not None:
+            query = self._filter(query, filters)
+        columns = self._projected_columns()
+        if columns is not None:
+            query = query.with_entities(*columns)
+        query = query.execution_options(stream_results=True)
+        return iter(query.yield_per(self.export_batch_size))
 
     def get_item(self, pk):
-        return self.get_query().get(pk)
+        options = self.get_load_options('read', 'update', 'delete')
+        return self.get_query().options(*options).get(pk)
 
     def create_item(self, form):
         item = self.new()
         return self.update_item(item, form)
 
+    def create_many(self, forms):
+        """Insert the items with ``Session.bulk_save_objects``, a
+        executemany ``INSERT``, in a single transaction.
+
+        Like it, only the columns are saved, not the relationships, and
+        the items primary keys are not fetched.
+        """
+        items = self._populate_many(forms)
+        with transaction(self.db_session) as session:
+            session.bulk_save_objects(items)
+        self.on_change()
+        return items
+
     def update_item(self, item, form):
-        form.populate_obj(item)
+        state = sa.inspect(item)
+        if state.transient or state.pending:
+            form.populate_obj(item)
+            return self.save(item)
+        self.populate_changed(item, form)
+        if not get_changed_keys(item):
+            # nothing to write, not even a transaction
+            return item
         return self.save(item)
 
     def delete_item(self, item):
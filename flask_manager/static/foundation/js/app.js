@@ -10,6 +10,32 @@
         field[0].form.submit();
     });
 
+    $('.remote-choices').each(function() {
+        var self = $(this);
+        self.select2({
+            width: '250px',
+            ajax: {
+                url: self.data('url'),
+                dataType: 'json',
+                delay: 250,
+                cache: true,
+                data: function(params) {
+                    return {q: params.term, page: params.page || 1};
+                }
+            }
+        }).on('change', function() {
+            var field = $('#'+self.data('field'));
+            var value = self.val();
+            if (!field.find('option').filter(function() {
+                return this.value === value;
+            }).length) {
+                field.append($('<option>').val(value).text(value));
+            }
+            field.val(value);
+            field[0].form.submit();
+        });
+    });
+
     $('#select-all').on('click', function() {
         var checked = document.getElementById('select-all').checked;
         for (let checkbox of document.getElementsByName('ids')) {
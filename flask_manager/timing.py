@@ -0,0 +1,118 @@
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+from flask import current_app, after_this_request, g
+from flask.signals import Namespace
+
+
+_signals = Namespace()
+
+#: sent after a timed request, with ``view`` and ``timings``, a dict
+#: of phase name to seconds, the sender is the app.
+request_timed = _signals.signal('request-timed')
+
+# (view, timings) of the request being timed, a context variable is
+# much cheaper to read than ``flask.g``, when the timing is disabled
+_current = ContextVar('flask_manager_timings', default=None)
+
+
+def start(view):
+    """Time the phases of the current request, until its response is
+    returned, which gets a ``Server-Timing`` header, and send
+    ``request_timed``, once per request.
+    """
+    current = _current.get()
+    if current is not None and current[0] is view:
+        return
+    timings = {}
+    token = _current.set((view, timings))
+    if '_flask_manager_timing' not in g:
+        # the state before the request, restored by ``reset``
+        g._flask_manager_timing = token
+    started = perf_counter()
+
+    @after_this_request
+    def finish(response):
+        _current.set(None)
+        timings['total'] = perf_counter() - started
+        response.headers['Server-Timing'] = format_header(timings)
+        request_timed.send(
+            current_app._get_current_object(), view=view, timings=timings)
+        return response
+
+
+def reset(exc=None):
+    """Stop timing the current request, even if it failed, a
+    ``teardown_request`` handler registered by ``Index`` blueprints.
+    """
+    token = g.pop('_flask_manager_timing', None)
+    if token is None:
+        return
+    try:
+        _current.reset(token)
+    except ValueError:
+        # set in another context, the one of a async view
+        _current.set(None)
+
+
+def get_timings():
+    """The timings of the current request, None if it is not timed."""
+    current = _current.get()
+    return current and current[1]
+
+
+def phase(name):
+    """Add the time spent in the block to the phase ``name``, phases
+    may be nested, the outer includes the inner.
+
+    Example:
+        with timing.phase('items'):
+            items = ...
+    """
+    timings = get_timings()
+    if timings is None:
+        return _disabled
+    return Phase(timings, name)
+
+
+class Phase:
+    __slots__ = ('timings', 'name', 'started')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = perf_counter() - self.started
+        self.timings[self.name] = self.timings.get(self.name, 0) + elapsed
+
+
+_disabled = nullcontext()
+
+
+def format_header(timings):
+    """``{'items': 0.0123}`` as ``items;dur=12.3``, in milliseconds."""
+    return ', '.join(
+        '{};dur={:.1f}'.format(name, seconds * 1000)
+        for name, seconds in timings.items())
+
+
+class Timed:
+    """Wrap a display rule, the calls are added to the phase ``name``,
+    anything else is read from the rule.
+    """
+
+    def __init__(self, name, rule):
+        self.name = name
+        self.rule = rule
+
+    def __call__(self, *args, **kwargs):
+        with phase(self.name):
+            return self.rule(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.rule, name)
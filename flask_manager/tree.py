@@ -1,7 +1,7 @@
 from cached_property import cached_property
 from flask import Blueprint
 
-from flask_manager import views, utils
+from flask_manager import views, utils, display_rules, timing
 
 
 class Tree:
@@ -65,6 +65,7 @@ class Tree:
     # }}} Tree interface
 
     # {{{ Menu interface
+    @utils.request_cached
     def endpoints_tree(self):
         """Get the entire tree endpoints."""
         if self.is_root():
@@ -92,6 +93,17 @@ class Tree:
             yield self.endpoint.strip('.')
         except AttributeError:
             pass
+
+    def all_display_rules(self):
+        for item in self.items:
+            yield from item.all_display_rules()
+
+    def warm(self):
+        """Fill the caches of the whole tree ahead of the first request,
+        needs a app context, e.g. in a worker post fork hook.
+        """
+        for item in self.items:
+            item.warm()
     # }}} Menu interface
 
     # {{{ Blueprint interface
@@ -99,6 +111,10 @@ class Tree:
         for item in self.items:
             yield from item.get_nodes()
 
+    def get_lazy_nodes(self):
+        for item in self.items:
+            yield from item.get_lazy_nodes()
+
     @cached_property
     def absolute_name(self):
         """Get the absolute name of ``self``.
@@ -123,18 +139,45 @@ class Tree:
     # }}} Blueprint interface
 
 
+def freeze_menu(menu):
+    """Convert a ``Tree.endpoints`` menu in nested tuples."""
+    name, endpoint, children = menu
+    return name, endpoint, tuple(freeze_menu(child) for child in children)
+
+
 class Index(Tree):
     view_class = views.LandingView
     decorators = ()
+    warm_templates = True
+    # build the views of the components on their first request
+    lazy = False
+    menu = None
 
     @cached_property
     def endpoint(self):
         return '.{}'.format(self._view_name())
 
+    def endpoints(self):
+        """The menu frozen by ``create_blueprint``, or the live menu
+        before it.
+        """
+        if self.menu is not None:
+            return self.menu
+        return super().endpoints()
+
+    def freeze_menu(self):
+        """Build the menu once, call again if the tree changes."""
+        self.menu = freeze_menu(Tree.endpoints(self))
+        return self.menu
+
     def get_nodes(self):
         yield from super().get_nodes()
         yield self._get_view()
 
+    def get_lazy_nodes(self):
+        yield from super().get_lazy_nodes()
+        yield self._get_view()
+
     # {{{ Helpers
     def _view_name(self):
         if self.is_root():
@@ -152,6 +195,7 @@ class Index(Tree):
         view = self.view_class.as_view(
             name, parent=self, view_name=name)
         return url, name, self._decorate_view(view)
+
     # }}}
 
     # {{{ Blueprint
@@ -167,12 +211,22 @@ class Index(Tree):
             static_url_path=static_url_path,
         )
         self.set_urls(blueprint)
+        blueprint.teardown_app_request(timing.reset)
+        self.freeze_menu()
+        if self.warm_templates and not self.lazy:
+            blueprint.record_once(self._warm_templates)
         return blueprint
 
+    def _warm_templates(self, state):
+        # resolve templates when the blueprint is registered in a app
+        with state.app.app_context():
+            display_rules.warm(self.all_display_rules())
+
     def set_urls(self, blueprint):
         # remove parent url
         absolute_url_len = len(utils.concat_urls(self.absolute_url))
-        for url, name, view in self.get_nodes():
+        nodes = self.get_lazy_nodes() if self.lazy else self.get_nodes()
+        for url, name, view in nodes:
             url = url[absolute_url_len:]
             blueprint.add_url_rule(
                 url, name.lower(), view,
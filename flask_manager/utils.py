@@ -1,5 +1,17 @@
+from functools import wraps
+import base64
+import binascii
+import json
 import re
 
+from flask import has_request_context, request
+from werkzeug.datastructures import MultiDict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 
 first_cap_re = re.compile('(.)([A-Z][a-z]+)')
 all_cap_re = re.compile('([a-z0-9])([A-Z])')
@@ -25,3 +37,119 @@ def slugify(value):
     s1 = first_cap_re.sub(r'\1_\2', value)
     s2 = all_cap_re.sub(r'\1_\2', s1)
     return s2.lower().replace(' _', '_').replace(' ', '_')
+
+
+def humanize_number(value):
+    """Short human readable number.
+
+    Args:
+        value (int)
+
+    Returns:
+        str: ``1234567`` as ``1.2M``
+    """
+    for suffix, size in (('B', 10**9), ('M', 10**6), ('K', 10**3)):
+        if abs(value) >= size:
+            text = '{:.1f}'.format(value / size)
+            if text.endswith('.0'):
+                text = text[:-2]
+            return text + suffix
+    return str(value)
+
+
+def encode_cursor(data):
+    """Encode a pagination cursor.
+
+    Args:
+        data: a json serializable object.
+
+    Returns:
+        str: a url safe token.
+    """
+    dumped = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(dumped).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a pagination cursor made by ``encode_cursor``.
+
+    Args:
+        token (str): the url safe token.
+
+    Returns:
+        the decoded object.
+
+    Raises:
+        ValueError: if ``token`` is not a valid cursor.
+    """
+    padding = '=' * (-len(token) % 4)
+    try:
+        dumped = base64.urlsafe_b64decode(token + padding)
+        return json.loads(dumped.decode('utf-8'))
+    except (TypeError, binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError('invalid cursor') from e
+
+
+def request_cached(method):
+    """Memoize a method result for the current request, in the request
+    object, so it never outlives the request, the result is shared, it
+    should not be mutated.
+
+    The cache key is the instance, the method and its args, which
+    must be hashable, outside of a request context nothing is cached.
+
+    Example:
+        class Controller(controller.Controller):
+            @request_cached
+            def get_roles(self):
+                ...
+    """
+    @wraps(method)
+    def wrapper(self, *args):
+        if not has_request_context():
+            return method(self, *args)
+        current = request._get_current_object()
+        try:
+            cache = current._flask_manager_cache
+        except AttributeError:
+            cache = current._flask_manager_cache = {}
+        key = (id(self), method.__qualname__, args)
+        try:
+            return cache[key]
+        except KeyError:
+            value = cache[key] = method(self, *args)
+            return value
+    return wrapper
+
+
+def dump_json(data):
+    """Serialize ``data`` to json bytes, with ``orjson`` if installed,
+    values json does not know are converted with ``str``.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, default=str, separators=(',', ':')).encode()
+
+
+def json_to_formdata(data):
+    """Convert a json object to the ``MultiDict`` a html form would post.
+
+    Lists are repeated keys, ``null`` and ``false`` are left out, like
+    a empty field or a unchecked checkbox.
+
+    Raises:
+        ValueError: if ``data`` is not a json object.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('expected a json object')
+    formdata = MultiDict()
+    for key, values in data.items():
+        if not isinstance(values, list):
+            values = [values]
+        for value in values:
+            if value is None or value is False:
+                continue
+            if value is True:
+                value = 'y'
+            formdata.add(key, str(value))
+    return formdata
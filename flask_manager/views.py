@@ -1,10 +1,14 @@
 from werkzeug.exceptions import MethodNotAllowed
 from flask import request, redirect, render_template, views
 
+from flask_manager import timing
+
 
 class View(views.View):
     template_name = None
     sucess_url = None
+    # time the request phases, see ``flask_manager.timing``
+    server_timing = False
 
     def __init__(self, view_name, success_url=None):
         """A Basic View with template.
@@ -22,13 +26,24 @@ class View(views.View):
         """Dispatch the request.
         Its the actual ``view`` flask will use.
         """
+        if self.server_timing:
+            timing.start(self)
         if request.method in ('POST', 'PUT'):
-            return_url, context = self.post(*args, **kwargs)
+            with timing.phase('post'):
+                return_url, context = self.post(*args, **kwargs)
             if return_url is not None:
-                return redirect(return_url)
+                return self.success_response(return_url, context)
         elif request.method in ('GET', 'HEAD'):
-            context = self.get(*args, **kwargs)
-        return self.render_response(self.context(context))
+            with timing.phase('get'):
+                context = self.get(*args, **kwargs)
+        with timing.phase('render'):
+            return self.render_response(self.context(context))
+
+    def success_response(self, return_url, context):
+        """The response of a successful ``post``, a redirect to
+        ``return_url``.
+        """
+        return redirect(return_url)
 
     def get(self, *args, **kwargs):
         """Handle the exibition of data.
@@ -87,6 +102,32 @@ class View(views.View):
         return render_template(self.get_template_name(), **context)
 
 
+class AsyncView(View):
+    """A View whose ``get`` and ``post`` are coroutines, served by the
+    flask async views support ( needs ``flask[async]`` ).
+    """
+
+    async def dispatch_request(self, *args, **kwargs):
+        if self.server_timing:
+            timing.start(self)
+        if request.method in ('POST', 'PUT'):
+            with timing.phase('post'):
+                return_url, context = await self.post(*args, **kwargs)
+            if return_url is not None:
+                return self.success_response(return_url, context)
+        elif request.method in ('GET', 'HEAD'):
+            with timing.phase('get'):
+                context = await self.get(*args, **kwargs)
+        with timing.phase('render'):
+            return self.render_response(self.context(context))
+
+    async def get(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def post(self, *args, **kwargs):
+        raise MethodNotAllowed(valid_methods=['GET'])
+
+
 class LandingView(View):
     template_name = ('crud/landing.html', )
 
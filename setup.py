@@ -44,6 +44,7 @@ setup(
     extras_require={
         'dev': ['ipython'],
         'test': ['coverage'],
+        'json': ['orjson'],
     },
     zip_safe=False,
     include_package_data=True,
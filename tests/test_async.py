@@ -0,0 +1,55 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from flask import Flask
+
+from flask_manager import tree as tree_
+from flask_manager.ext import async_sqlalchemy
+
+
+Base = orm.declarative_base()
+
+
+class Model(Base):
+    __tablename__ = 'model'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+
+
+class Controller(async_sqlalchemy.AsyncSQLAlchemyController):
+    model_class = Model
+
+
+@pytest.fixture
+def session(tmp_path):
+    url = 'sqlite:///{}'.format(tmp_path / 'test.db')
+    engine = sa.create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(Model.__table__.insert(), [
+            {'name': 'name {}'.format(i)} for i in range(3)])
+    engine.dispose()
+    engine = create_async_engine(
+        url.replace('sqlite', 'sqlite+aiosqlite'), poolclass=NullPool)
+    yield AsyncSession(engine, expire_on_commit=False)
+
+
+def test_session_closed_after_request(session):
+    tree = tree_.Index(name='Example', url='', items=[
+        Controller(db_session=session)])
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secret'
+    app.config['TESTING'] = True
+    app.register_blueprint(tree.create_blueprint())
+    client = app.test_client()
+    for _ in range(2):
+        response = client.get('/model/')
+        assert response.status_code == 200
+        assert b'name 2' in response.data
+        assert not session.in_transaction()
+    response = client.post('/model/update/1/', data={'name': 'changed'})
+    assert response.status_code == 302
+    assert b'changed' in client.get('/model/read/1/').data
+    assert not session.in_transaction()
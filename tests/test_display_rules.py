@@ -0,0 +1,55 @@
+import pytest
+from flask import Flask
+from jinja2 import ChoiceLoader, DictLoader
+
+from flask_manager import tree as tree_, display_rules
+
+
+MACRO = '{% macro render_field(item, name, value) %}{} {% endmacro %}'
+TEMPLATES = {
+    'plain.html': MACRO.replace('{}', '<td>{{ value }}</td>'),
+    'none.html': MACRO.replace(
+        '{}', '<td>{% if value is none %}-{% else %}{{ value }}{% endif %}'
+        '</td>'),
+    'number.html': MACRO.replace(
+        '{}', '<td>{% if value is number %}#{% endif %}{{ value }}</td>'),
+    'item.html': MACRO.replace('{}', '<td>{{ item.id }}{{ value }}</td>'),
+}
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.register_blueprint(
+        tree_.Index(name='Example', url='', items=[]).create_blueprint())
+    app.jinja_loader = ChoiceLoader([DictLoader(TEMPLATES), app.jinja_loader])
+    with app.test_request_context():
+        yield app
+
+
+def field(template_name):
+    return type('Field', (display_rules.CellField, ), {
+        'template_name': template_name})
+
+
+@pytest.mark.parametrize('template_name, compiled', [
+    ('crud/macros/table.html', True),
+    ('plain.html', True),
+    ('none.html', False),
+    ('number.html', False),
+    ('item.html', False),
+])
+def test_compile(app, template_name, compiled):
+    assert (field(template_name)('name').compile() is not None) == compiled
+
+
+@pytest.mark.parametrize('template_name', [
+    'crud/macros/table.html', 'none.html', 'number.html', 'item.html'])
+@pytest.mark.parametrize('value', [None, 0, 'a <b>', 1.5])
+def test_compiled_renders_as_the_macro(app, template_name, value):
+    field_class = field(template_name)
+    column_set = type('Columns', (display_rules.ColumnSet, ), {
+        'field_class': field_class})
+    item = {'id': 1, 'name': value}
+    expected = column_set(['name'])(item)
+    assert column_set(['name'], compiled=True)(item) == expected
@@ -0,0 +1,104 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+from flask import Flask
+
+from flask_manager import tree as tree_, display_rules
+from flask_manager.ext import sqlalchemy
+
+
+Base = orm.declarative_base()
+
+
+class Model(Base):
+    __tablename__ = 'model'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+    version = sa.Column(sa.Integer(), nullable=False)
+    __mapper_args__ = {'version_id_col': version}
+
+
+class Counted(Base):
+    __tablename__ = 'counted'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+    version = sa.Column(sa.Integer(), nullable=False, default=1)
+
+
+db_session = orm.scoped_session(orm.sessionmaker())
+
+
+class Controller(sqlalchemy.SQLAlchemyController):
+    db_session = db_session
+    model_class = Model
+    extra_display_rules = {'list': display_rules.ColumnSet(['name'])}
+    version_column = 'version'
+    cache_fragments = True
+    list_projection = True
+
+
+class CountedController(sqlalchemy.SQLAlchemyController):
+    db_session = db_session
+    model_class = Counted
+    version_column = 'version'
+
+
+@pytest.fixture
+def engine():
+    engine = sa.create_engine('sqlite://')
+    yield engine
+    db_session.remove()
+    engine.dispose()
+
+
+def create_app(engine, **kwargs):
+    Base.metadata.create_all(engine)
+    db_session.configure(bind=engine)
+    db_session.add_all(Model(name='name {}'.format(i)) for i in range(3))
+    db_session.add_all(Counted(name='name {}'.format(i)) for i in range(3))
+    db_session.commit()
+    tree = tree_.Index(name='Example', url='', items=[
+        Controller(**kwargs), CountedController()])
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secret'
+    app.config['TESTING'] = True
+    app.register_blueprint(tree.create_blueprint())
+    app.teardown_appcontext(lambda exc: db_session.remove())
+    return app
+
+
+def test_projected_list_with_cached_fragments(engine):
+    client = create_app(engine).test_client()
+    for _ in range(2):
+        response = client.get('/model/')
+        assert response.status_code == 200
+        assert b'name 2' in response.data
+
+
+def test_projected_keyset_list_with_cached_fragments(engine):
+    client = create_app(engine, keyset_pagination=True).test_client()
+    response = client.get('/model/?order_by=name')
+    assert response.status_code == 200
+    assert b'name 2' in response.data
+
+
+def test_update_changes_the_version(engine):
+    client = create_app(engine).test_client()
+    etag = client.get('/counted/read/1/').headers['ETag']
+    response = client.post('/counted/update/1/', data={'name': 'changed'})
+    assert response.status_code == 302
+    response = client.get('/counted/read/1/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert db_session.get(Counted, 1).version == 2
+
+
+def test_batched_changes_the_version(engine):
+    app = create_app(engine)
+
+    def rename(controller, items):
+        items[0].name = 'changed'
+
+    with app.test_request_context('/'):
+        CountedController().run_batched([1, 2], rename)
+        versions = [item.version for item in db_session.query(Counted)]
+    assert sorted(versions) == [1, 1, 2]
@@ -0,0 +1,105 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+from flask import Flask
+
+from flask_manager import tree as tree_, utils
+from flask_manager.ext import sqlalchemy
+
+
+Base = orm.declarative_base()
+
+
+class Model(Base):
+    __tablename__ = 'model'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255))
+    created = sa.Column(sa.Date())
+
+
+db_session = orm.scoped_session(orm.sessionmaker())
+
+
+class Controller(sqlalchemy.SQLAlchemyController):
+    db_session = db_session
+    model_class = Model
+    keyset_pagination = True
+    per_page = 3
+
+
+@pytest.fixture
+def client():
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db_session.configure(bind=engine)
+    names = ['c', None, 'a', 'b', None, 'a', 'd']
+    db_session.add_all(Model(name=name) for name in names)
+    db_session.commit()
+    tree = tree_.Index(name='Example', url='', items=[Controller()])
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secret'
+    app.config['TESTING'] = True
+    app.register_blueprint(tree.create_blueprint())
+    app.teardown_appcontext(lambda exc: db_session.remove())
+    yield app.test_client()
+    db_session.remove()
+    engine.dispose()
+
+
+def get_page(client, **args):
+    response = client.get(
+        '/model/', query_string=args, headers={'Accept': 'application/json'})
+    assert response.status_code == 200
+    data = response.get_json()
+    ids = [item['id'] for item in data['items']]
+    return ids, data['pagination']
+
+
+@pytest.mark.parametrize('order_by, expected', [
+    ('name', [3, 6, 4, 1, 7, 2, 5]),
+    ('-name', [5, 2, 7, 1, 4, 6, 3]),
+    (None, [1, 2, 3, 4, 5, 6, 7]),
+])
+def test_pages_forward_and_back(client, order_by, expected):
+    args = {} if order_by is None else {'order_by': order_by}
+    pages, cursor = [], None
+    while True:
+        ids, pagination = get_page(client, cursor=cursor, **args)
+        pages.append(ids)
+        cursor = pagination['next_cursor']
+        if cursor is None:
+            break
+    assert sum(pages, []) == expected
+    cursor = pagination['prev_cursor']
+    for ids in reversed(pages[:-1]):
+        page, pagination = get_page(client, cursor=cursor, **args)
+        assert page == ids
+        cursor = pagination['prev_cursor']
+
+
+@pytest.mark.parametrize('order_by, values', [
+    ('name', [{'a': 1}, 1]),
+    ('name', [['a'], 1]),
+    ('name', [1, 1]),
+    ('name', [True, 1]),
+    (None, ['x']),
+    (None, [1.5]),
+    (None, [False]),
+    ('created', [1, 1]),
+    ('created', ['not a date', 1]),
+    ('name', ['a']),
+])
+def test_malformed_cursor(client, order_by, values):
+    cursor = utils.encode_cursor(['next', values])
+    args = {'cursor': cursor}
+    if order_by is not None:
+        args['order_by'] = order_by
+    response = client.get('/model/', query_string=args)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('cursor', ['not base64', utils.encode_cursor(
+    ['up', [1]]), utils.encode_cursor({'next': [1]})])
+def test_malformed_token(client, cursor):
+    response = client.get('/model/', query_string={'cursor': cursor})
+    assert response.status_code == 400
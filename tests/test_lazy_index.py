@@ -0,0 +1,83 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+from flask import Flask, url_for
+
+from flask_manager import tree as tree_
+from flask_manager.ext import sqlalchemy
+
+
+Base = orm.declarative_base()
+
+
+class Model(Base):
+    __tablename__ = 'model'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+
+
+db_session = orm.scoped_session(orm.sessionmaker())
+
+
+class Controller(sqlalchemy.SQLAlchemyController):
+    db_session = db_session
+    model_class = Model
+    views_built = 0
+
+    def _get_view(self, component, endpoint):
+        self.views_built += 1
+        return super()._get_view(component, endpoint)
+
+
+@pytest.fixture(params=[None, '/admin'])
+def app(request):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db_session.configure(bind=engine)
+    db_session.add_all(Model(name='name {}'.format(i)) for i in range(3))
+    db_session.commit()
+    tree = tree_.Index(name='Admin', url='', items=[
+        tree_.Tree('Group', items=[
+            Controller(name='First'), Controller(name='Second'),
+        ]),
+    ])
+    tree.lazy = True
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secret'
+    app.config['TESTING'] = True
+    app.register_blueprint(tree.create_blueprint(), url_prefix=request.param)
+    app.teardown_appcontext(lambda exc: db_session.remove())
+    app.url_prefix = request.param or ''
+    app.tree = tree
+    yield app
+    db_session.remove()
+    engine.dispose()
+
+
+def controllers(app):
+    group, = app.tree.items
+    return group.items
+
+
+def test_first_request_builds_the_view(app):
+    client = app.test_client()
+    first, second = controllers(app)
+    rules = len(list(app.url_map.iter_rules()))
+    assert first.views_built == second.views_built == 0
+    response = client.get(app.url_prefix + '/group/first/read/2/')
+    assert response.status_code == 200
+    assert b'name 1' in response.data
+    assert client.get(app.url_prefix + '/group/first/').status_code == 200
+    assert client.get(app.url_prefix + '/group/first/read/1/').status_code \
+        == 200
+    assert client.get(app.url_prefix + '/group/first/nope/').status_code \
+        == 404
+    assert (first.views_built, second.views_built) == (2, 0)
+    assert len(list(app.url_map.iter_rules())) == rules
+
+
+def test_url_for_before_the_first_request(app):
+    with app.test_request_context():
+        url = url_for('admin.group:second:read:read', pk=1)
+    assert url == app.url_prefix + '/group/second/read/1/'
+    assert app.test_client().get(url).status_code == 200
@@ -0,0 +1,117 @@
+import pytest
+import wtforms
+from flask import Flask
+
+from flask_manager import tree as tree_, display_rules
+from flask_manager.ext import memory
+
+
+class Form(wtforms.Form):
+    name = wtforms.StringField()
+    tags = wtforms.SelectMultipleField(choices=[('a', 'A'), ('b', 'B')])
+
+
+class Controller(memory.MemoryController):
+    form_class = Form
+    filters = {'tags': memory.FieldFilter('tags')}
+    orderable = ('name', )
+    display_rules = {
+        'list': display_rules.ColumnSet(['name']),
+        'read': display_rules.DataFieldSet(['name']),
+        'create': display_rules.SimpleForm(),
+        'update': display_rules.SimpleForm(),
+        'delete': display_rules.DataFieldSetWithConfirm(['name']),
+    }
+
+
+@pytest.fixture
+def storage():
+    storage = memory.MemoryStorage()
+    storage.add_hash_index('tags')
+    storage.add_sorted_index('name')
+    storage.insert_many([
+        memory.Record(name='a', tags='x'), memory.Record(name='b', tags='y'),
+        memory.Record(name=None, tags='x'), memory.Record(name=3, tags='y'),
+    ])
+    return storage
+
+
+def indexes(storage):
+    hash_indexes = storage.hash_indexes.items()
+    sorted_indexes = storage.sorted_indexes.items()
+    return (
+        {field: dict(index) for field, index in hash_indexes},
+        {field: list(index) for field, index in sorted_indexes},
+    )
+
+
+def test_insert_unhashable_value(storage):
+    before = indexes(storage), dict(storage.items), storage.next_pk
+    item = memory.Record(name='c', tags=['x'])
+    with pytest.raises(TypeError):
+        storage.insert(item)
+    assert (indexes(storage), storage.items, storage.next_pk) == before
+    assert 'id' not in item
+
+
+def test_update_to_existing_pk(storage):
+    before = indexes(storage), dict(storage.items)
+    item = storage.get(1)
+    with pytest.raises(KeyError):
+        with storage.updating(item):
+            item.id = 2
+            item.name = 'changed'
+    assert (indexes(storage), storage.items) == before
+    assert item == {'id': 1, 'name': 'a', 'tags': 'x'}
+
+
+def test_update_unhashable_value(storage):
+    before = indexes(storage), storage.version
+    item = storage.get(1)
+    with pytest.raises(TypeError):
+        with storage.updating(item):
+            item.name = 'changed'
+            item.tags = ['x']
+    assert (indexes(storage), storage.version) == before
+    assert item == {'id': 1, 'name': 'a', 'tags': 'x'}
+
+
+def test_update_pk(storage):
+    item = storage.get(1)
+    with storage.updating(item):
+        item.id = 10
+    assert storage.get(1) is None and storage.get(10) is item
+    assert storage.sorted_indexes['id'][-1] == (memory.sort_key(10), 10)
+    assert storage.hash_indexes['tags']['x'] == {3, 10}
+    assert storage.insert(memory.Record(name='d')).id == 11
+
+
+def test_select_mixed_types(storage):
+    query = memory.Query(storage)
+    items, total = storage.select(query, 'name')
+    assert [item.name for item in items] == [3, 'a', 'b', None]
+    items, total = storage.select(query.filter_by('tags', 'y'), '-name')
+    assert [item.name for item in items] == ['b', 3] and total == 2
+
+
+def test_controller(storage):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secret'
+    app.config['TESTING'] = True
+    tree = tree_.Index(name='Example', url='', items=[
+        Controller(name='memory', storage=storage)])
+    app.register_blueprint(tree.create_blueprint())
+    client = app.test_client()
+    response = client.get('/memory/?tags=y&order_by=name')
+    assert response.status_code == 200
+    assert b'> b </td>' in response.data
+    assert b'> a </td>' not in response.data
+    response = client.post('/memory/update/1/', data={'tags': ['a', 'b']})
+    assert response.status_code == 200
+    assert storage.get(1).tags == 'x'
+
+
+def test_controller_keyset_pagination(storage):
+    with pytest.raises(ValueError):
+        Controller(
+            name='memory', storage=storage, keyset_pagination=True)
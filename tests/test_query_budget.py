@@ -0,0 +1,96 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+from flask import Flask
+
+from flask_manager import tree as tree_, display_rules
+from flask_manager.ext import sqlalchemy
+
+
+Base = orm.declarative_base()
+
+
+class Parent(Base):
+    __tablename__ = 'parent'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+
+
+class Child(Base):
+    __tablename__ = 'child'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    name = sa.Column(sa.String(255), nullable=False)
+    parent_id = sa.Column(sa.ForeignKey(Parent.id), nullable=False)
+    parent = orm.relationship(Parent)
+
+    @property
+    def parent_name(self):
+        return self.parent.name
+
+
+db_session = orm.scoped_session(orm.sessionmaker())
+
+
+class Controller(sqlalchemy.SQLAlchemyController):
+    db_session = db_session
+    model_class = Child
+    extra_display_rules = {
+        'list': display_rules.ColumnSet(['name', 'parent_name']),
+    }
+    eager_load = {'list': ()}  # a lazy load of parent per row
+    query_accounting = True
+    max_repeated_queries = 3
+    query_budget_action = 'raise'
+
+
+class EagerController(Controller):
+    eager_load = {'list': ('parent', )}
+
+
+@pytest.fixture
+def app():
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db_session.configure(bind=engine)
+    parents = [Parent(name='parent {}'.format(i)) for i in range(10)]
+    db_session.add_all(parents)
+    db_session.add_all(
+        Child(name='child {}'.format(i), parent=parents[i % 10])
+        for i in range(30))
+    db_session.commit()
+    tree = tree_.Index(name='Example', url='', items=[
+        Controller(name='lazy'), EagerController(name='eager')])
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'secret'
+    app.config['TESTING'] = True
+    app.register_blueprint(tree.create_blueprint())
+    app.teardown_appcontext(lambda exc: db_session.remove())
+    yield app
+    db_session.remove()
+    engine.dispose()
+
+
+def test_n_plus_one_is_over_budget(app):
+    with pytest.raises(sqlalchemy.QueryBudgetExceeded):
+        app.test_client().get('/lazy/')
+
+
+def test_eager_list_is_counted(app):
+    with app.test_client() as client:
+        response = client.get('/eager/')
+        stats = sqlalchemy.get_query_stats()
+    assert response.status_code == 200
+    assert stats.count <= 3
+    assert stats.most_repeated()[1] == 1
+
+
+def test_failed_statement_is_not_counted(app):
+    controller = Controller()
+    with app.test_request_context('/'):
+        with controller.track_queries() as stats:
+            with pytest.raises(sa.exc.OperationalError):
+                db_session.execute(sa.text('SELECT * FROM missing'))
+            db_session.execute(sa.text('SELECT 1'))
+            started = db_session.connection().info['_flask_manager_started']
+    assert stats.count == 1
+    assert started == []
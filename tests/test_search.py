@@ -0,0 +1,51 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from flask_manager.ext import sqlalchemy
+
+
+Base = orm.declarative_base()
+
+
+class Order(Base):
+    __tablename__ = 'Order'
+    id = sa.Column(sa.Integer(), primary_key=True)
+    group = sa.Column(sa.String(255))
+    note = sa.Column(sa.Text())
+
+
+search = sqlalchemy.SearchFilter(
+    [Order.group, Order.note], backend=sqlalchemy.SQLiteFTS5())
+
+
+@pytest.fixture
+def session():
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = orm.Session(engine)
+    session.add_all([
+        Order(group='hello world', note='quick brown fox'),
+        Order(group='select', note='hello there'),
+    ])
+    session.commit()
+    with engine.begin() as connection:
+        search.create_index(connection)
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def search_ids(session, value):
+    query = search.filter(value, session.query(Order))
+    return sorted(order.id for order in query)
+
+
+def test_fts5_quoted_names(session):
+    assert search_ids(session, 'hello') == [1, 2]
+    session.add(Order(group='fox', note=None))
+    session.get(Order, 2).note = 'goodbye'
+    session.delete(session.get(Order, 1))
+    session.commit()
+    assert search_ids(session, 'hello') == []
+    assert search_ids(session, 'fox') == [3]